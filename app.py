@@ -1,21 +1,41 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import os
+import numpy as np
 import sys
 import re
 import json
 import io
 
-from src.data_loader import load_year_data, load_school_map, load_kkov_map, get_long_format, normalize_column_name, load_capacity_data, load_izo_to_redizo_map
-from src.utils import get_grade_level, get_reason_label, clean_pdf_text, clean_col_name, reason_map
+from src.data_loader import load_rounds_data, load_school_map, load_kkov_map, get_long_format, normalize_column_name
+from src.catalog import get_available_years, get_available_rounds
+from src.utils import get_reason_label, clean_pdf_text, clean_col_name, reason_map
+from src.utils import REASON_ADMITTED, REASON_HIGHER_PRIORITY, REASON_CAPACITY, REASON_FAILED, REASON_GAVE_UP
 from src.pdf_generator import create_pdf_report
-from src.ui_components import inject_custom_css, render_kpi_cards
-from src.analysis import calculate_kpis, get_decile_data
+from src.ui_components import inject_custom_css, render_kpi_cards, render_rank_badges, COMPARABLE_METRICS
+from src.analysis import calculate_kpis, calculate_kpis_grouped, kpis_from_row, add_ranks
+from src.capacity import load_capacity_index, lookup_capacities, get_group_capacities
+from src.kpi_cube import load_kpi_cube, lookup_cube_kpis
+from src.ranking import get_group_ranks
+from src.flows import get_flow_matrix, top_destinations, top_sources, FLOW_CATEGORIES
+from src.competition import load_co_application, top_competitors, label_competitors, LEVEL_SCHOOL, LEVEL_FIELD
+from src.simulation import simulate_baseline, run_scenario
+from src.score_index import get_score_index, query_score, get_regions
+from src.histograms import build_histograms, group_histogram, hist_percentile, BIN_VALUES
+from src.strategy import get_admission_model, admission_probability, recommend_applications
+from src.similarity import get_similarity_index, nearest_schools
+from src.trends import load_multi_year, build_trends, trend_series, top_movers, label_groups, TREND_KEYS
+from src.ingest import swap_to_latest, pending_changes, ingest
+from src.parallel import prefetch_year
 
 # --- CONFIG ---
 st.set_page_config(page_title="JPZ", layout="wide")
 
+# --- DATA VERSION ---
+# Hot swap to the latest ingested build (src/ingest.py): only the affected cache entries are dropped
+if swap_to_latest():
+    st.toast("Načtena nová verze dat.")
+
 # --- NAVIGATION LOGIC ---
 if 'view_mode' not in st.session_state:
     st.session_state.view_mode = "Srovnání škol"
@@ -40,6 +60,16 @@ if st.session_state.get('pending_back_nav'):
     if 'saved_fields_selection' in st.session_state:
         st.session_state['_pending_upload_fields'] = st.session_state['saved_fields_selection']
 
+if st.session_state.get('pending_similar_nav'):
+    # Detail view -> comparison of the school and its most similar schools (all their fields)
+    st.session_state['_pending_upload_schools'] = st.session_state.pop('pending_similar_nav')
+    st.session_state['_pending_upload_fields'] = None
+    st.session_state.view_mode = "Srovnání škol"
+    st.session_state['navigated_from_comparison'] = False
+    for key in ['detail_fields_select', 'single_school_select']:
+        if key in st.session_state:
+            del st.session_state[key]
+
 # --- UI INITIALIZATION ---
 inject_custom_css()
 
@@ -49,14 +79,23 @@ inject_custom_css()
 # --- REMOVED: Load Functions (now in src/data_loader.py) ---
 
 # --- SESSION STATE INITIALIZATION ---
+# Dataset catalog (src/catalog.py) scans the data directory once and is reused across reruns
+available_years = get_available_years()
 if 'selected_year' not in st.session_state:
-    available_years = sorted([f[2:6] for f in os.listdir('.') if f.startswith('PZ') and f.endswith('.xlsx')], reverse=True)
     st.session_state.selected_year = available_years[0] if available_years else "2025"
 
 # --- SIDEBAR: CORE FILTERS ---
 st.sidebar.markdown("### 📊 Nastavení analýzy")
 
-available_years = sorted(list(set([f[2:6] for f in os.listdir('.') if f.startswith('PZ') and f.endswith('.xlsx')])), reverse=True)
+# New or corrected Cermat exports dropped into the data directory
+changed_sources, removed_sources = pending_changes()
+if changed_sources or removed_sources:
+    st.sidebar.info("Nová nebo změněná data: " + ", ".join(changed_sources + removed_sources))
+    if st.sidebar.button("🔄 Zpracovat nová data", key='ingest_run'):
+        with st.spinner("Zpracovávám nová data..."):
+            ingest()
+        st.rerun()
+
 if not available_years:
     st.error("Nenalezena žádná data.")
     st.stop()
@@ -67,52 +106,17 @@ selected_year = st.sidebar.radio("Rok konání", available_years, index=y_idx, k
 st.session_state.selected_year = selected_year
 
 # --- DATA LOADING ---
+# First hit of a year: all its workbooks are parsed at once in worker processes (src/parallel.py)
+prefetch_year(selected_year)
 school_map = load_school_map()
-izo_to_redizo = load_izo_to_redizo_map()
-raw_df = load_year_data(selected_year)
-# Load capacities for all possible rounds (currently up to 2)
-capacity_dfs = {r: load_capacity_data(selected_year, r) for r in [1, 2]}
-
-def get_planned_capacity(riz, kkov, cap_dfs, selected_rounds):
-    """
-    Finds planned capacity for a specific school and field based on baseline logic:
-    - Translates facility IZO to institution REDIZO using izo_to_redizo mapping.
-    - If 1. kolo is selected (even with other rounds), use R1 as baseline.
-    - If ONLY 2. kolo (or others) is selected, use that specific round's capacity.
-    """
-    if not selected_rounds or not cap_dfs: return None
-    kkov_str = str(kkov).strip()
-    
-    # Translate facility IZO to institution REDIZO
-    riz_str = str(riz)
-    redizo = izo_to_redizo.get(riz_str, riz_str)
-    
-    # Priority: if R1 is in selected_rounds, use R1 capacity
-    target_round = 1 if 1 in selected_rounds else selected_rounds[0]
-    
-    df = cap_dfs.get(target_round)
-    if df is None or df.empty: return None
-
-    # Try to find a match using REDIZO column (capacity files use institution-level REDIZO)
-    if 'REDIZO' not in df.columns: return None
-    
-    match = df[(df['REDIZO'] == redizo) & (df['KKOV'] == kkov_str)]
-    if not match.empty:
-        return int(match['KAPACITA'].sum())
-    
-    # Fallback: try with original riz_str in case it's already a REDIZO
-    if redizo != riz_str:
-        match = df[(df['REDIZO'] == riz_str) & (df['KKOV'] == kkov_str)]
-        if not match.empty:
-            return int(match['KAPACITA'].sum())
-    
-    return None
+# Capacity index keyed by (REDIZO, KKOV, round), see src/capacity.py
+capacity_index = load_capacity_index(selected_year)
 
-if raw_df.empty:
+available_rounds = get_available_rounds(selected_year)
+if not available_rounds:
     st.warning(f"Data pro rok {selected_year} nejsou k dispozici.")
     st.stop()
 
-available_rounds = sorted(raw_df['kolo'].dropna().unique().astype(int).tolist())
 st.sidebar.markdown("### Kolo zkoušky")
 selected_rounds = []
 # Fixed 2-column layout for checkboxes is cleaner
@@ -130,11 +134,12 @@ for i, r in enumerate(available_rounds):
 
 st.session_state.selected_rounds = selected_rounds
 
-filtered_df = raw_df[raw_df['kolo'].isin(selected_rounds)] if selected_rounds else raw_df.iloc[0:0]
+# Only the ticked rounds are loaded; partitions are shared across reruns (read-only)
+filtered_df = load_rounds_data(selected_year, tuple(selected_rounds)) if selected_rounds else pd.DataFrame()
 
 # --- DATA TRANSFORMATION (Lazy Loading) ---
 kkov_map = load_kkov_map()
-from src.data_loader import get_sidebar_options, get_long_format
+from src.data_loader import get_sidebar_options, get_long_format, filter_by_grade
 
 # Lightweight available options for sidebar
 all_lite_schools, available_grades = get_sidebar_options(filtered_df, school_map)
@@ -148,12 +153,7 @@ else:
 
 # Filter raw WIDE data by grade for more accurate school list
 if selected_grade and selected_grade != "Všechny":
-    from src.utils import get_grade_level
-    k_cols = [f'ss{j}_kkov' for j in range(1, 6) if f'ss{j}_kkov' in filtered_df.columns]
-    mask = pd.Series(False, index=filtered_df.index)
-    for c in k_cols:
-        mask = mask | (filtered_df[c].map(get_grade_level) == selected_grade)
-    grade_filtered_df = filtered_df[mask]
+    grade_filtered_df = filter_by_grade(filtered_df, selected_grade)
     available_schools, _ = get_sidebar_options(grade_filtered_df, school_map)
 else:
     grade_filtered_df = filtered_df
@@ -161,7 +161,7 @@ else:
 
 # --- SIDEBAR: VIEW MODE ---
 st.sidebar.markdown("---")
-view_modes = ["Srovnání škol", "Detailní rozbor školy"]
+view_modes = ["Srovnání škol", "Detailní rozbor školy", "Kam se dostanu?", "Vývoj v čase"]
 
 # Use explicit key for stable widget identity across reruns
 if 'view_mode_radio' not in st.session_state:
@@ -192,7 +192,9 @@ if not grade_filtered_df.empty:
                 # We need a small long_df to get field names for validation
                 val_df = get_long_format(grade_filtered_df, school_map, kkov_map, school_names_filter=pending_schools)
                 valid_field_options = sorted(val_df['FieldLabel'].unique().astype(str).tolist()) if not val_df.empty else []
-                validated_fields = [f for f in st.session_state['_pending_upload_fields'] if f in valid_field_options]
+                pending_fields = st.session_state['_pending_upload_fields']
+                # None = all fields of the pending schools (e.g. "compare with similar")
+                validated_fields = valid_field_options if pending_fields is None else [f for f in pending_fields if f in valid_field_options]
                 st.session_state['fields_select_v2'] = validated_fields
             del st.session_state['_pending_upload_fields']
         
@@ -249,7 +251,7 @@ if not grade_filtered_df.empty:
                 st.error(st.session_state.upload_error)
                 del st.session_state['upload_error']
 
-    else:
+    elif view_mode == "Detailní rozbor školy":
         # Detail Mode: Select single school
         st.sidebar.markdown("### 🏛️ Výběr školy")
         
@@ -279,12 +281,127 @@ if not grade_filtered_df.empty:
             selected_fields = st.sidebar.multiselect("Vyberte obory", options=available_fields, key='detail_fields_select', placeholder="Zvolte...")
         else:
             selected_fields = []
+    else:
+        # Score query mode works on the whole year (no school selection)
+        selected_schools, selected_fields, long_df = [], [], pd.DataFrame()
 else:
     st.sidebar.warning("Žádná data pro vybrané parametry.")
     selected_schools, selected_fields, long_df = [], [], pd.DataFrame()
 
 
 # --- MAIN PAGE CONTENT ---
+if view_mode == "Vývoj v čase":
+    # Year-partitioned KPI store of all years, keyed by REDIZO + KKOV (src/trends.py)
+    st.title("📉 Vývoj v čase")
+    trend_store = load_multi_year()
+    if trend_store.empty:
+        st.info("Nejsou k dispozici žádná data.")
+        st.stop()
+    trends = build_trends(trend_store)
+    st.caption(f"Roky: {', '.join(str(y) for y in trends['years'])} · všechna kola a všichni uchazeči daného roku; školy sjednoceny podle REDIZO, obory podle KKOV.")
+
+    trend_label = st.selectbox("Metrika", list(COMPARABLE_METRICS.keys()), key='trend_metric')
+    trend_metric = COMPARABLE_METRICS[trend_label]
+    trend_groups = label_groups(trend_store[TREND_KEYS].drop_duplicates())
+    t1, t2 = st.columns([1, 2])
+    trend_school = t1.selectbox("Škola", sorted(trend_groups['school'].unique()), key='trend_school', placeholder="Zvolte...")
+    school_groups = trend_groups[trend_groups['school'] == trend_school]
+    trend_fields = t2.multiselect("Obory", sorted(school_groups['field']), default=sorted(school_groups['field'])[:5], key='trend_fields', placeholder="Zvolte...")
+
+    series = label_groups(trend_series(trends, school_groups[school_groups['field'].isin(trend_fields)][TREND_KEYS].itertuples(index=False, name=None), trend_metric))
+    if series.empty:
+        st.info("Zvolte alespoň jeden obor.")
+    else:
+        fig_trend = px.line(series, x='year', y='value', color='field', markers=True, template="plotly_white", height=400,
+                            labels={'year': 'Rok', 'value': trend_label, 'field': 'Obor'})
+        fig_trend.update_xaxes(tickmode='array', tickvals=trends['years'])
+        fig_trend.update_layout(margin=dict(l=40, r=40, t=20, b=40), legend=dict(orientation="h", yanchor="top", y=-0.2, xanchor="left", x=0))
+        st.plotly_chart(fig_trend, width='stretch')
+        trend_table = series.pivot_table(index='field', columns='year', values='value')
+        if len(trends['years']) > 1 and trends['years'][-2] in trend_table.columns and trends['years'][-1] in trend_table.columns:
+            trend_table[f"Změna {trends['years'][-2]}→{trends['years'][-1]}"] = trend_table[trends['years'][-1]] - trend_table[trends['years'][-2]]
+        trend_table.columns = [str(c) for c in trend_table.columns]
+        st.dataframe(trend_table.round(2).rename_axis('Obor').reset_index(), hide_index=True, width='stretch')
+
+    st.markdown("---")
+    st.markdown(f"### Největší meziroční změny: {trend_label}")
+    rises, falls = top_movers(trends, trend_metric)
+    if rises.empty:
+        st.info("Pro meziroční srovnání chybí obory přítomné v obou posledních letech.")
+    else:
+        mover_cols = {'school': 'Škola', 'field': 'Obor', 'before': str(trends['years'][-2]), 'after': str(trends['years'][-1]), 'delta': 'Změna'}
+        m1, m2 = st.columns(2)
+        m1.markdown("**📈 Nárůst**")
+        m1.dataframe(label_groups(rises)[list(mover_cols)].rename(columns=mover_cols).round(2), hide_index=True, width='stretch')
+        m2.markdown("**📉 Pokles**")
+        m2.dataframe(label_groups(falls)[list(mover_cols)].rename(columns=mover_cols).round(2), hide_index=True, width='stretch')
+    st.stop()
+
+if view_mode == "Kam se dostanu?":
+    # Score query: binary search in the sorted minimum scores of all fields (src/score_index.py)
+    st.title(f"🎯 Kam se dostanu? – JPZ {selected_year}")
+    score_index = get_score_index(selected_year, tuple(sorted(selected_rounds))) if selected_rounds else None
+    if score_index is None:
+        st.info("Pro vybraná kola nejsou k dispozici data o přijatých.")
+        st.stop()
+
+    q1, q2 = st.columns([1, 2])
+    score = q1.number_input("Počet bodů (průměr ČJ a MA v %)", min_value=0.0, max_value=100.0, value=50.0, step=0.5, key='score_query')
+    regions = get_regions(score_index)
+    region = q2.selectbox("Kraj", ["Všechny"] + regions, key='score_region') if regions else "Všechny"
+    grade = selected_grade if selected_grade and selected_grade != "Všechny" else None
+
+    hits = query_score(score_index, score, grade, None if region == "Všechny" else region)
+    st.markdown(f"S **{score:g} body** by byl uchazeč přijat na **{len(hits)}** oborů (podle posledního přijatého bez úlevy z ČJ"
+                + (f", ročník {grade}" if grade else "") + (f", {region}" if region != "Všechny" else "") + ").")
+    if hits.empty:
+        st.info("Žádný obor neodpovídá zadanému počtu bodů.")
+    else:
+        hits_table = hits.sort_values(['min_score', 'admitted'], ascending=False).rename(columns={
+            'SchoolName': 'Škola', 'FieldLabel': 'Obor', 'region': 'Kraj', 'min_score': 'Body posledního přijatého',
+            'margin': 'Rezerva (b.)', 'share': 'Přijatí se stejným či nižším skóre (%)', 'admitted': 'Přijatých'})
+        st.dataframe(hits_table[['Škola', 'Obor', 'Kraj', 'Body posledního přijatého', 'Rezerva (b.)', 'Přijatí se stejným či nižším skóre (%)', 'Přijatých']]
+                     .round({'Rezerva (b.)': 1, 'Přijatí se stejným či nižším skóre (%)': 1}),
+                     hide_index=True, width='stretch', height=600)
+
+    # Priority strategy: P(admitted | score, slot) per field and a branch-and-bound search over orderings (src/strategy.py)
+    st.markdown("---")
+    st.markdown("### 🧭 Doporučené pořadí přihlášek")
+    admission_model = get_admission_model(selected_year, tuple(sorted(selected_rounds)))
+    candidates = score_index['groups']
+    if grade: candidates = candidates[candidates['Grade'] == grade]
+    if region != "Všechny": candidates = candidates[candidates['region'] == region]
+    candidate_labels = {f"{s} – {f}": (s, f) for s, f in zip(candidates['SchoolName'], candidates['FieldLabel'])}
+    shortlist = st.multiselect("Obory, o které máte zájem (v pořadí od nejžádanějšího, nejvýše 30)", options=sorted(candidate_labels),
+                               max_selections=30, key='strategy_fields', placeholder="Zvolte...")
+    goal = st.radio("Cíl", ["Co nejlepší obor podle pořadí výběru", "Co nejvyšší šance na přijetí kamkoli"], horizontal=True, key='strategy_goal')
+    if shortlist and admission_model is not None:
+        keys = [candidate_labels[label] for label in shortlist]
+        prob = admission_probability(admission_model, keys, score)
+        utility = np.linspace(1.0, 1.0 / len(keys), len(keys)) if goal.startswith("Co nejlepší") else np.ones(len(keys))
+        plan, _ = recommend_applications(prob, utility)
+        p_slot = np.array([prob[i, s] for s, i in enumerate(plan)])
+        reach = np.cumprod(np.r_[1.0, 1 - p_slot[:-1]])
+        st.markdown(f"Šance na přijetí alespoň na jeden obor: **{(1 - np.prod(1 - p_slot)) * 100:.0f} %**")
+        st.dataframe(pd.DataFrame({
+            'Priorita': np.arange(1, len(plan) + 1),
+            'Škola – obor': [shortlist[i] for i in plan],
+            'Šance na přijetí (%)': (p_slot * 100).round(0),
+            'Šance, že rozhodne tato přihláška (%)': (reach * p_slot * 100).round(0),
+        }), hide_index=True, width='stretch')
+        st.caption("Odhad z výsledků vybraného roku podle bodů a priority přihlášky (vyhlazeno ±5 bodů); přihlášky jsou považovány za nezávislé.")
+
+        # Probability curves of the shortlist at the recommended slot
+        curve_points = np.arange(0, 100.5, 0.5)
+        curves = pd.concat([pd.DataFrame({'Body': curve_points, 'Šance na přijetí (%)': admission_model['prob'][gid, s] * 100, 'Obor': shortlist[i]})
+                            for s, i in enumerate(plan) if (gid := admission_model['index'].get_indexer([tuple(keys[i])])[0]) >= 0])
+        if not curves.empty:
+            fig_curves = px.line(curves, x='Body', y='Šance na přijetí (%)', color='Obor', template="plotly_white", height=350)
+            fig_curves.add_vline(x=score, line_dash='dash', line_color='grey')
+            fig_curves.update_layout(margin=dict(l=40, r=40, t=20, b=40), legend=dict(orientation="h", yanchor="top", y=-0.2, xanchor="left", x=0))
+            st.plotly_chart(fig_curves, width='stretch')
+    st.stop()
+
 if view_mode == "Detailní rozbor školy" and selected_schools:
     school_name = selected_schools[0]
     
@@ -307,24 +424,34 @@ if view_mode == "Detailní rozbor školy" and selected_schools:
     with col_tgl:
         st.markdown('<div style="text-align: right;">', unsafe_allow_html=True)
         use_deciles = st.checkbox("Decilové zobrazení", key="decile_detail", help="Normalizuje vodorovnou osu na 0-100 % kapacity oboru.")
+        use_histogram = st.checkbox("Histogram", key="hist_detail", help="Počty přijatých po 0,5 bodu místo pořadí jednotlivých uchazečů.")
         st.markdown('</div>', unsafe_allow_html=True)
 
     admitted_only_all = long_df[long_df['Prijat'] == 1].copy()
-    if not admitted_only_all.empty:
+    if not admitted_only_all.empty and use_histogram:
+        # Fixed 0.5-point bins per field/outcome/exempt flag (src/histograms.py), admitted only
+        import plotly.graph_objects as go
+        field_hists = build_histograms(school_data, by=['FieldLabel'])
+        fig_hist = go.Figure()
+        colors_pts = px.colors.qualitative.Plotly
+        for i, field in enumerate(sorted(school_data['FieldLabel'].unique().astype(str))):
+            h = group_histogram(field_hists, [field], outcomes=[REASON_ADMITTED])
+            if not h.any(): continue
+            median = hist_percentile(group_histogram(field_hists, [field], outcomes=[REASON_ADMITTED], exempt=False), 50)
+            nz = np.flatnonzero(h)
+            name = f"{field} (medián {median:g} b.)" if median is not None else field
+            fig_hist.add_trace(go.Bar(x=BIN_VALUES[nz], y=h[nz], name=name, marker_color=colors_pts[i % len(colors_pts)], opacity=0.75))
+        fig_hist.update_layout(barmode='overlay', bargap=0, xaxis_title="Body", yaxis_title="Počet přijatých", template="plotly_white", height=400,
+                               margin=dict(l=40, r=40, t=20, b=40), legend=dict(orientation="h", yanchor="top", y=-0.1, xanchor="left", x=0))
+        st.plotly_chart(fig_hist, width='stretch')
+    elif not admitted_only_all.empty:
         import plotly.graph_objects as go
         fig_pts = go.Figure()
         
-        plot_df = get_decile_data(school_data[school_data['Prijat'] == 1]) if use_deciles else school_data[school_data['Prijat'] == 1].copy()
-        if not use_deciles:
-            # Add Rank manually if not using get_decile_data which adds Percentile
-            res_list = []
-            for name, group in plot_df.groupby(['FieldLabel']):
-                group_s = group.sort_values('TotalPoints', ascending=False).reset_index(drop=True)
-                group_s['Rank'] = group_s.index + 1
-                res_list.append(group_s)
-            plot_df = pd.concat(res_list) if res_list else plot_df
-
-        groups_pts = sorted(plot_df.groupby(['FieldLabel']), key=lambda x: x[0])
+        # Rank and Percentile of all fields at once
+        plot_df = add_ranks(school_data[school_data['Prijat'] == 1], by=['FieldLabel'])
+
+        groups_pts = sorted(plot_df.groupby(['FieldLabel'], observed=True), key=lambda x: x[0])
         colors_pts = px.colors.qualitative.Plotly
         
         for i, (field, group) in enumerate(groups_pts):
@@ -347,10 +474,8 @@ if view_mode == "Detailní rozbor školy" and selected_schools:
     total_planned = 0
     riz_detail = str(school_data['RED_IZO'].iloc[0]) if not school_data.empty else None
     if riz_detail:
-        for kkov in school_data['KKOV'].unique():
-            kkov_s = str(kkov)
-            cap = get_planned_capacity(riz_detail, kkov_s, capacity_dfs, selected_rounds)
-            if cap: total_planned += cap
+        detail_caps = lookup_capacities(capacity_index, [(riz_detail, kkov) for kkov in school_data['KKOV'].unique()], selected_rounds)
+        total_planned = sum(cap for cap in detail_caps if cap)
             
     kpi_res = calculate_kpis(school_data, planned_capacity=total_planned if total_planned > 0 else None)
     
@@ -360,6 +485,12 @@ if view_mode == "Detailní rozbor školy" and selected_schools:
 
     render_kpi_cards(kpi_res)
     
+    # National percentile of every field among peers with the same KKOV (precomputed ranking)
+    field_ranks = get_group_ranks(selected_year, selected_rounds, school_name, selected_fields)
+    if not field_ranks.empty:
+        with st.expander("🏅 Celostátní pořadí (percentil mezi obory se stejným KKOV)", expanded=True):
+            render_rank_badges(field_ranks)
+    
     st.markdown("---")
     
     # 2. Charts Row
@@ -418,7 +549,9 @@ if view_mode == "Detailní rozbor školy" and selected_schools:
     
     # 3. Reasons Row (Restored)
     st.markdown("#### 🤔 Proč nebyli uchazeči přijati?")
-    reason_counts = school_data[school_data['Prijat'] != 1]['Reason'].value_counts().reset_index()
+    reason_counts = school_data[school_data['Prijat'] != 1]['Reason'].value_counts()
+    # Categorical value_counts lists unused categories too - keep only present reasons
+    reason_counts = reason_counts[reason_counts > 0].reset_index()
     reason_counts.columns = ['Důvod', 'Počet']
     reason_counts['Důvod Label'] = reason_counts['Důvod'].map(lambda x: reason_map.get(x, x))
     
@@ -432,34 +565,26 @@ if view_mode == "Detailní rozbor školy" and selected_schools:
     
     # Redistribution Charts - Now stacked vertically with synced scale
     st.markdown("### 🔄 Analýza přelivu (Kam odešli ti, co k vám nenastoupili?)")
-    not_here = school_data[school_data['Prijat'] != 1]
+    # Precomputed sparse flow matrix (per category), queried for the selected fields
+    flows = get_flow_matrix(selected_year, selected_rounds, selected_grade)
+    source_keys = [(school_name, f) for f in selected_fields]
+    outflows = {cat: top_destinations(flows, source_keys, cat) if flows else pd.DataFrame(columns=['label', 'count']) for cat in FLOW_CATEGORIES}
     
-    # Robust categorization
-    cat_a = not_here[not_here['Reason'].str.contains('vyssi_priorit|vyssi prioritu', case=False, na=False)]
-    cat_b = not_here[not_here['Reason'].str.contains('kapacit', case=False, na=False)]
-    cat_c = not_here[not_here['Reason'].str.contains('nespln|neprosp|nesplnil|nedosah|kriteri', case=False, na=False)]
+    # Global max across all categories for synced scale
+    global_max = max([int(df['count'].max()) for df in outflows.values() if not df.empty] + [1]) # Min 1 to avoid range [0,0]
     
-    # NEW: Find global max across all categories for synced scale
-    def get_max_count(df_red):
-        df_v = df_red[df_red['AcceptedDetail'] != "Nepřijat / neznámá"]
-        return df_v['AcceptedDetail'].value_counts().max() if not df_v.empty else 0
-    
-    global_max = max(get_max_count(cat_a), get_max_count(cat_b), get_max_count(cat_c), 1) # Min 1 to avoid range [0,0]
-    
-    def plot_redistribution(df_red, title, color_scale, max_x):
-        df_valid = df_red[df_red['AcceptedDetail'] != "Nepřijat / neznámá"]
-        if df_valid.empty:
-            st.info(f"Pro kategorii '{title}' nemáme data o přijetí jinam.")
+    def plot_redistribution(counts, title, color_scale, max_x, axis_label='Cíl (Škola + Obor)', empty_msg="nemáme data o přijetí jinam"):
+        if counts.empty:
+            st.info(f"Pro kategorii '{title}' {empty_msg}.")
             return
         
         try:
-            counts = df_valid['AcceptedDetail'].value_counts().reset_index().head(15)
-            counts.columns = ['Cíl (Škola + Obor)', 'Počet']
+            counts = counts.rename(columns={'label': axis_label, 'count': 'Počet'})
             
             # Dynamic height with minimum to prevent rendering issues
             calc_height = max(250, 100 + (len(counts) * 45))
             
-            fig = px.bar(counts, x='Počet', y='Cíl (Škola + Obor)', orientation='h',
+            fig = px.bar(counts, x='Počet', y=axis_label, orientation='h',
                           title=title, color='Počet', color_continuous_scale=color_scale, 
                           height=calc_height, text='Počet',
                           range_x=[0, max_x * 1.1])
@@ -476,9 +601,79 @@ if view_mode == "Detailní rozbor školy" and selected_schools:
             st.warning(f"Chyba při vykreslování grafu '{title}': {e}")
 
     # Stacked vertically as requested with synced scale
-    plot_redistribution(cat_a, "A) Přijati na vyšší prioritu", "Viridis", global_max)
-    plot_redistribution(cat_b, "B) Nepřijati z kapacitních důvodů", "Plasma", global_max)
-    plot_redistribution(cat_c, "C) Nepřijati pro nesplnění podmínek (neprospěli)", "Magma", global_max)
+    plot_redistribution(outflows[REASON_HIGHER_PRIORITY], "A) Přijati na vyšší prioritu", "Viridis", global_max)
+    plot_redistribution(outflows[REASON_CAPACITY], "B) Nepřijati z kapacitních důvodů", "Plasma", global_max)
+    plot_redistribution(outflows[REASON_FAILED], "C) Nepřijati pro nesplnění podmínek (neprospěli)", "Magma", global_max)
+
+    # Reverse direction: where were our admitted students rejected (same flow matrix, transposed)
+    if flows:
+        with st.expander("↩️ Odkud k vám přišli (kde byli vaši přijatí odmítnuti)"):
+            dest_labels = [f"{school_name} ({f})" for f in selected_fields]
+            inflows = {cat: top_sources(flows, dest_labels, cat) for cat in FLOW_CATEGORIES}
+            in_max = max([int(df['count'].max()) for df in inflows.values() if not df.empty] + [1])
+            plot_redistribution(inflows[REASON_HIGHER_PRIORITY], "A) Nižší priority, které dali přednost vám", "Viridis", in_max, 'Zdroj (Škola + Obor)', "nemáme žádné přijaté")
+            plot_redistribution(inflows[REASON_CAPACITY], "B) Jinde odmítnuti z kapacitních důvodů", "Plasma", in_max, 'Zdroj (Škola + Obor)', "nemáme žádné přijaté")
+            plot_redistribution(inflows[REASON_FAILED], "C) Jinde nesplnili podmínky", "Magma", in_max, 'Zdroj (Škola + Obor)', "nemáme žádné přijaté")
+
+    # Competitors: schools/fields sharing applicants (co-application graph weighted by priority)
+    coapp = load_co_application(selected_year)
+    if not coapp.empty:
+        with st.expander("🥊 Konkurenční školy (společní uchazeči)"):
+            st.caption("Všechna kola a ročníky, všichni uchazeči školy (všechny její obory a RED_IZO). Podíl = část různých uchazečů školy, "
+                       "kteří se hlásili i jinam. Vážené skóre zvýhodňuje dvojice přihlášek na vyšších prioritách (1. = 1,0 … 5. = 0,2).")
+            tab_schools, tab_fields = st.tabs(["Školy", "Obory"])
+            for tab, level in ((tab_schools, LEVEL_SCHOOL), (tab_fields, LEVEL_FIELD)):
+                with tab:
+                    rivals = label_competitors(top_competitors(coapp, school_name, level), level)
+                    if rivals.empty:
+                        st.info("Žádní společní uchazeči.")
+                        continue
+                    st.dataframe(rivals[['name', 'count', 'share', 'weight']].rename(columns={
+                        'name': 'Škola' if level == LEVEL_SCHOOL else 'Škola – obor', 'count': 'Společní uchazeči',
+                        'share': 'Podíl (%)', 'weight': 'Vážené skóre'}).round({'Podíl (%)': 1, 'Vážené skóre': 2}),
+                        hide_index=True, width='stretch')
+
+    # Nearest neighbours in the standardized school KPI space (src/similarity.py)
+    similarity_index = get_similarity_index(selected_year, tuple(sorted(selected_rounds)))
+    similar = nearest_schools(similarity_index, school_name) if similarity_index else pd.DataFrame()
+    if not similar.empty:
+        with st.expander("🧬 Podobné školy (celostátně)"):
+            st.caption("Podle indexu reálné poptávky, bodů posledního přijatého, úspěšnosti 1. priority, intenzity odlivu a kapacity školy (všichni uchazeči vybraných kol).")
+            st.dataframe(similar.reset_index().rename(columns={
+                'SchoolName': 'Škola', 'pure_demand_idx': 'Index reálné poptávky', 'min_score': 'Body posledního přijatého',
+                'p1_loyalty': 'Úspěšnost 1. priority (%)', 'release_rate': 'Intenzita odlivu (%)', 'capacity': 'Kapacita', 'distance': 'Vzdálenost'}).round(2),
+                hide_index=True, width='stretch')
+            if st.button("📊 Porovnat s podobnými", key='compare_similar'):
+                st.session_state['pending_similar_nav'] = [school_name] + similar.index.tolist()
+                st.rerun()
+
+    # What-if: re-run the priority allocation of all applicants with a changed capacity
+    with st.expander("🧪 Simulace: co kdyby obor přidal (ubral) místa?"):
+        st.caption("Přepočítá přijímací řízení všech uchazečů vybraných kol (bez filtru ročníku) podle bodů a pořadí priorit. "
+                   "Srovnává se se simulací při plánovaných kapacitách, ne se skutečnými výsledky.")
+        sim_cols = st.columns([3, 1, 1])
+        sim_field = sim_cols[0].selectbox("Obor", sorted(selected_fields), key='sim_field')
+        sim_delta = sim_cols[1].number_input("Změna počtu míst", min_value=-100, max_value=200, value=10, step=5, key='sim_delta')
+        if sim_cols[2].button("Spustit simulaci", key='sim_run'):
+            sim_base = simulate_baseline(selected_year, tuple(sorted(selected_rounds)))
+            sim_key = (school_name, sim_field)
+            if sim_base.empty or sim_key not in sim_base.index:
+                st.info("Pro vybraný obor nelze simulaci spustit.")
+            else:
+                row = sim_base.loc[sim_key]
+                seats = row['planned_capacity'] if not pd.isna(row['planned_capacity']) else row['total_admitted']
+                before, after = run_scenario(selected_year, selected_rounds, {sim_key: max(0, int(seats) + sim_delta)})
+                if before.empty:
+                    st.info("Změna kapacity by výsledky přijímacího řízení neovlivnila.")
+                else:
+                    sim_table = pd.DataFrame({
+                        'Kapacita': before['planned_capacity'].astype('Int64').astype(str) + ' → ' + after['planned_capacity'].astype('Int64').astype(str),
+                        'Přijatí': before['total_admitted'].astype(str) + ' → ' + after['total_admitted'].astype(str),
+                        'Body posledního přijatého': before['min_score'].round(1).astype(str) + ' → ' + after['min_score'].round(1).astype(str),
+                        'Změna přijatých': after['total_admitted'] - before['total_admitted'],
+                    }).reset_index().rename(columns={'SchoolName': 'Škola', 'FieldLabel': 'Obor'})
+                    st.markdown(f"Změna ovlivní **{len(sim_table)}** oborů:")
+                    st.dataframe(sim_table.sort_values('Změna přijatých', key=abs, ascending=False), hide_index=True, width='stretch')
 
     # Talent Comparison Chart (Tiny horizontal bar)
     # Talent Comparison Chart (Tiny horizontal bar)
@@ -515,7 +710,7 @@ admitted_only = display_df[display_df['Prijat'] == 1].copy()
 if view_mode == "Srovnání škol":
     # --- Color Mapping ---
     # Create a stable color map for all selected school-field combinations
-    all_groups = sorted(display_df.groupby(['SchoolName', 'FieldLabel']).groups.keys())
+    all_groups = sorted(display_df.groupby(['SchoolName', 'FieldLabel'], observed=True).groups.keys())
     color_palette = px.colors.qualitative.Plotly
     # We use a consistent label format for mapping
     color_map = {f"{s} ({f})": color_palette[i % len(color_palette)] for i, (s, f) in enumerate(all_groups)}
@@ -535,16 +730,9 @@ if view_mode == "Srovnání škol":
         import plotly.graph_objects as go
         fig = go.Figure()
         
-        plot_df_comp = get_decile_data(admitted_only) if use_deciles_comp else admitted_only.copy()
-        if not use_deciles_comp:
-            res_list = []
-            for name, group in plot_df_comp.groupby(['SchoolName', 'FieldLabel']):
-                group_s = group.sort_values('TotalPoints', ascending=False).reset_index(drop=True)
-                group_s['Rank'] = group_s.index + 1
-                res_list.append(group_s)
-            plot_df_comp = pd.concat(res_list) if res_list else plot_df_comp
+        plot_df_comp = add_ranks(admitted_only)
 
-        groups = sorted(plot_df_comp.groupby(['SchoolName', 'FieldLabel']), key=lambda x: x[0])
+        groups = sorted(plot_df_comp.groupby(['SchoolName', 'FieldLabel'], observed=True), key=lambda x: x[0])
         for (school, field), group in groups:
             label = f"{school} ({field})"
             color = color_map.get(label, "#333")
@@ -561,33 +749,7 @@ if view_mode == "Srovnání škol":
     st.markdown("---")
     st.markdown("### 📊 Srovnání škol podle metriky")
     
-    comparable_metrics = {
-        # Block 1: Hlavní výsledky
-        "Celkový zájem (přihlášky)": "total_apps",
-        "Index převisu": "comp_idx",
-        "Index reálné poptávky": "pure_demand_idx",
-        "Celková úspěšnost (%)": "success_rate",
-        
-        # Block 2: Bodová úroveň
-        "Bodový průměr přijatých": "avg_admitted",
-        "Body posledního přijatého": "min_score",
-        "Průměr horních 10 %": "elite_avg",
-        "Průměr spodních 25 %": "bottom_25_avg",
-        "Bodový rozdíl (Gap)": "talent_gap",
-        
-        # Block 3: Strategické ukazatele
-        "Poptávka skalních zájemců (%)": "interest_p1_pct",
-        "Podíl skalních žáků (%)": "intake_p1_pct",
-        "Podíl náhradních voleb (P3+) (%)": "intake_p3p_pct",
-        "Intenzita odlivu (%)": "release_rate",
-        
-        # Block 5: Kapacitní analýza
-        "Plánovaná kapacita": "planned_capacity",
-        "Míra naplněnosti (%)": "fullness_rate",
-        "Volná místa": "vacant_seats",
-        "Vzdali se přijetí": "gave_up_count",
-        "Úspěšnost 1. priority (%)": "p1_loyalty"
-    }
+    comparable_metrics = COMPARABLE_METRICS
     
     selected_metric_label = st.selectbox("Vyberte metriku pro srovnání", options=list(comparable_metrics.keys()))
     
@@ -602,13 +764,14 @@ if view_mode == "Srovnání škol":
     # Calculate metrics for all selected groups
     metric_data = []
     overlay_data = []
-    for (school, field), group in display_df.groupby(['SchoolName', 'FieldLabel']):
-        # Get capacity for this specific school/field combination
-        riz = str(group['RED_IZO'].iloc[0])
-        kkov = str(group['KKOV'].iloc[0])
-        field_cap = get_planned_capacity(riz, kkov, capacity_dfs, selected_rounds)
-        
-        kpis = calculate_kpis(group, planned_capacity=field_cap)
+    # KPIs from the precomputed cube; live computation (all groups in one pass) only if the cube can't answer
+    kpi_table = lookup_cube_kpis(load_kpi_cube(selected_year), selected_rounds, selected_grade, display_df, capacity_index)
+    if kpi_table is None:
+        group_caps = get_group_capacities(display_df, capacity_index, selected_rounds)
+        kpi_table = calculate_kpis_grouped(display_df, group_caps)
+    for row in kpi_table.to_dict('records'):
+        school, field = row['SchoolName'], row['FieldLabel']
+        kpis = kpis_from_row(row)
         val = kpis.get(selected_metric_key)
         if val is not None:
             # Scale metrics if labels have (%) and it's not already handled in analysis
@@ -725,7 +888,8 @@ if not display_df.empty:
     else:
         st.markdown("#### 📋 Podrobné statistiky oboru")
     
-    groups = sorted(display_df.groupby(['SchoolName', 'FieldLabel']), key=lambda x: x[0])
+    groups = sorted(display_df.groupby(['SchoolName', 'FieldLabel'], observed=True), key=lambda x: x[0])
+    group_caps = get_group_capacities(display_df, capacity_index, selected_rounds)
     color_map = {}
     stats_data = []
 
@@ -748,9 +912,7 @@ if not display_df.empty:
         color_map[(school, field)] = px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)]
         
         # 3. Kapacita
-        riz_val = str(group['RED_IZO'].iloc[0])
-        kkov_val = str(group['KKOV'].iloc[0])
-        planned_cap = get_planned_capacity(riz_val, kkov_val, capacity_dfs, selected_rounds)
+        planned_cap = group_caps.get((school, field))
         
         # 4. Počet přihlášek
         total_apps = len(group)
@@ -772,19 +934,19 @@ if not display_df.empty:
         prio_adm_str = "+".join(map(str, prio_adm_counts))
         
         # 9. Vzdali se (NEW)
-        gave_up = group[group.get('GaveUpSpot', False) == True]
+        gave_up = group[group['ReasonCode'] == REASON_GAVE_UP]
         gave_up_stat = format_stat(gave_up)
 
         # 10. Vyšší priorita (vzdal se nebo přijat výše)
-        higher_prio = group[group['Reason'].str.contains('vzdal|vyssi_prioritu', case=False, na=False)]
+        higher_prio = group[group['ReasonCode'].isin([REASON_GAVE_UP, REASON_HIGHER_PRIORITY])]
         higher_prio_stat = format_stat(higher_prio)
         
         # 11. Kapacit. důvod
-        cap_reject = group[group['Reason'].str.contains('kapacit', case=False, na=False)]
+        cap_reject = group[group['ReasonCode'] == REASON_CAPACITY]
         cap_stat = format_stat(cap_reject)
         
         # 12. Nesplnili
-        failed = group[group['Reason'].str.contains('nespln|neprosp|nesplnil|nedosah|kriteri', case=False, na=False)]
+        failed = group[group['ReasonCode'] == REASON_FAILED]
         failed_stat = format_stat(failed)
         
         stats_data.append({
@@ -0,0 +1,85 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from src.data_loader import load_year_data, load_school_map, load_kkov_map, get_long_format, build_admission_map
+
+def legacy_admission_map(df_wide, str_school_map, kkov_map):
+    """Original row-by-row implementation (iterrows over admitted students), kept for comparison"""
+    success_map_school = {}
+    success_map_detail = {}
+    for i in range(1, 6):
+        r_col, k_col, p_col = f'ss{i}_redizo', f'ss{i}_kkov', f'ss{i}_prijat'
+        if p_col in df_wide.columns:
+            sub_adm = df_wide[df_wide[p_col] == 1]
+            for idx, row in sub_adm.iterrows():
+                uuid = row['Student_UUID']
+                if uuid not in success_map_school:
+                    riz = str(row[r_col])
+                    school_name = str_school_map.get(riz, f"Neznámá škola ({riz})")
+                    success_map_school[uuid] = school_name
+                    kkov = str(row[k_col]) if pd.notna(row[k_col]) else "?"
+                    field_name = kkov_map.get(kkov, kkov)
+                    success_map_detail[uuid] = f"{school_name} ({field_name} ({kkov}))"
+    return success_map_school, success_map_detail
+
+def prepare_wide(raw_df):
+    """Same wide preparation as get_long_format (UUID + string REDIZO columns)"""
+    df_wide = raw_df.copy()
+    df_wide['Student_UUID'] = range(len(df_wide))
+    for j in range(1, 6):
+        col = f'ss{j}_redizo'
+        if col in df_wide.columns:
+            df_wide[col] = pd.to_numeric(df_wide[col], errors='coerce').fillna(0).astype(int).astype(str)
+    return df_wide
+
+def timed(fn, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn(*args)
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return out, best
+
+def run_benchmark(year):
+    print(f"\n--- BENCHMARK {year} ---")
+    raw_df = load_year_data(year)
+    if raw_df.empty:
+        print("Žádná data.")
+        return
+    school_map = load_school_map() if os.path.exists('skoly.csv') else {}
+    kkov_map = load_kkov_map()
+    str_school_map = {str(k): v for k, v in school_map.items()}
+    df_wide = prepare_wide(raw_df)
+
+    (old_school, old_detail), t_old = timed(legacy_admission_map, df_wide, str_school_map, kkov_map, repeat=1)
+    # New path works directly on the numeric wide frame (as called from get_long_format)
+    (new_school, new_detail), t_new = timed(build_admission_map, raw_df, str_school_map, kkov_map)
+    new_school, new_detail = np.asarray(new_school, dtype=object), np.asarray(new_detail, dtype=object)
+
+    # Verify identical results
+    uuids = df_wide['Student_UUID'].to_numpy()
+    exp_school = np.array([old_school.get(u, "Nepřijat / neznámá") for u in uuids], dtype=object)
+    exp_detail = np.array([old_detail.get(u, "Nepřijat / neznámá") for u in uuids], dtype=object)
+    same = (exp_school == new_school).all() and (exp_detail == new_detail).all()
+
+    print(f"Uchazečů: {len(df_wide)}, přijatých: {len(old_school)}")
+    print(f"Mapa přijetí – iterrows:   {t_old * 1000:8.1f} ms")
+    print(f"Mapa přijetí – vektorově:  {t_new * 1000:8.1f} ms  ({t_old / t_new:.0f}× rychleji)")
+    print(f"Shoda výsledků: {'ANO' if same else 'NE'}")
+
+    long_df, t_long = timed(get_long_format.__wrapped__, raw_df, school_map, kkov_map)
+    print(f"get_long_format celkem:    {t_long * 1000:8.1f} ms ({len(long_df)} řádků)")
+
+    # Memory: categorical long frame vs. the former per-row string representation
+    cat_cols = [c for c in long_df.columns if isinstance(long_df[c].dtype, pd.CategoricalDtype)]
+    as_strings = long_df.astype({c: object for c in cat_cols})
+    mem_old = as_strings.memory_usage(deep=True).sum() / 1e6
+    mem_new = long_df.memory_usage(deep=True).sum() / 1e6
+    print(f"Paměť long formátu – řetězce:    {mem_old:8.1f} MB")
+    print(f"Paměť long formátu – kategorie:  {mem_new:8.1f} MB  ({mem_old / mem_new:.0f}× méně)")
+
+if __name__ == "__main__":
+    run_benchmark("2024")
+    run_benchmark("2025")
@@ -0,0 +1,53 @@
+import time
+import tracemalloc
+import pandas as pd
+from src.catalog import get_datasets, KIND_APPLICANTS
+from src.data_loader import read_applicant_workbook
+from src.schema import normalize_column_name, APPLICANT_COLUMNS
+
+def legacy_read_applicant_workbook(path):
+    """Original reader (pd.read_excel of all columns, renamed afterwards), kept for comparison"""
+    df = pd.read_excel(path)
+    df.columns = [normalize_column_name(c) for c in df.columns]
+    unique_cols = []
+    seen = set()
+    for c in df.columns:
+        if c not in seen:
+            unique_cols.append(c)
+            seen.add(c)
+        else:
+            unique_cols.append(f"{c}_dup_{len(seen)}")
+    df.columns = unique_cols
+    for col in [c for c in df.columns if 'redizo' in c or c == 'kolo' or 'procentni_skor' in c]:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in [c for c in df.columns if 'prijat' in c]:
+        if df[col].dtype == bool:
+            df[col] = df[col].astype(int)
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+    return df
+
+def measured(fn, path):
+    """(result, seconds, peak traced memory in MB); time and memory are measured in separate runs"""
+    t = time.perf_counter()
+    fn(path)
+    elapsed = time.perf_counter() - t
+    tracemalloc.start()
+    out = fn(path)
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+def run_benchmark(path):
+    print(f"\n--- {path} ---")
+    old, t_old, m_old = measured(legacy_read_applicant_workbook, path)
+    new, t_new, m_new = measured(read_applicant_workbook, path)
+    cols = [c for c in old.columns if c in APPLICANT_COLUMNS]
+    same = list(new.columns) == cols and all(old[c].dtype == new[c].dtype and old[c].equals(new[c]) for c in cols)
+    print(f"pd.read_excel (vše):   {t_old:6.2f} s, špička {m_old:6.1f} MB, {old.shape[1]} sloupců")
+    print(f"Streamování (výběr):   {t_new:6.2f} s, špička {m_new:6.1f} MB, {new.shape[1]} sloupců")
+    print(f"Shoda použitých sloupců: {'ANO' if same else 'NE'}")
+
+if __name__ == "__main__":
+    for entry in get_datasets(KIND_APPLICANTS):
+        run_benchmark(entry['path'])
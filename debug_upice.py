@@ -2,6 +2,7 @@ import pandas as pd
 import os
 from src.data_loader import load_year_data, load_school_map, load_kkov_map, get_long_format, load_capacity_data, load_izo_to_redizo_map
 from src.analysis import calculate_kpis
+from src.utils import REASON_GAVE_UP, REASON_UNKNOWN
 
 def debug_upice():
     year = "2024"
@@ -76,8 +77,8 @@ def debug_upice():
     admitted = school_data[school_data['Prijat'] == 1]
     print(f"\nUnique Reasons for admitted students: {admitted['Reason'].value_counts().to_dict()}")
     
-    gave_up = school_data[school_data['Reason'].str.contains('vzdal', case=False, na=False)]
-    gave_up_admitted = admitted[admitted['Reason'].str.contains('vzdal', case=False, na=False)]
+    gave_up = school_data[school_data['ReasonCode'] == REASON_GAVE_UP]
+    gave_up_admitted = admitted[admitted['ReasonCode'] == REASON_GAVE_UP]
     
     print("\n--- Admitted counts per field ---")
     for kkov in school_data['KKOV'].unique():
@@ -105,7 +106,7 @@ def debug_upice():
     print(f"Total 'vzdal se' in all applicants: {len(gave_up)}")
     print(f"Total 'vzdal se' among admitted: {len(gave_up_admitted)}")
     
-    neuvedeno_not_prijat = school_data[(school_data['Reason'] == 'Neuvedeno') & (school_data['Prijat'] != 1)]
+    neuvedeno_not_prijat = school_data[(school_data['ReasonCode'] == REASON_UNKNOWN) & (school_data['Prijat'] != 1)]
     print(f"\n--- Applicants with Reason: Neuvedeno but Prijat != 1 (Count: {len(neuvedeno_not_prijat)}) ---")
     if not neuvedeno_not_prijat.empty:
         print(neuvedeno_not_prijat[['RED_IZO', 'KKOV', 'Prijat', 'Reason', 'Priority']].to_string())
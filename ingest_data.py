@@ -0,0 +1,18 @@
+import sys
+from src.ingest import ingest, pending_changes
+
+if __name__ == "__main__":
+    force = '--force' in sys.argv[1:]
+    changed, removed = pending_changes()
+    if not changed and not removed and not force:
+        print("Žádné nové ani změněné soubory.")
+    else:
+        for name in changed: print(f"  změněno: {name}")
+        for name in removed: print(f"  odebráno: {name}")
+    build = ingest(force=force)
+    if build:
+        print(f"Verze {build['version']} ({build['seconds']:.1f} s), roky: {', '.join(build['years']) or '-'}")
+        for name, seconds in build['parse_seconds'].items():
+            print(f"  načteno {name}: {seconds:.1f} s")
+        for year, artifacts in build['artifact_seconds'].items():
+            print(f"  {year}: " + ", ".join(f"{a} {s:.1f} s" for a, s in artifacts.items()))
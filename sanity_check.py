@@ -1,35 +1,40 @@
 import pandas as pd
+import numpy as np
 import os
-from src.data_loader import load_year_data, load_school_map, load_kkov_map, get_long_format, load_capacity_data, load_izo_to_redizo_map
-from src.analysis import calculate_kpis
+import openpyxl
+from src.data_loader import load_year_data, load_school_map, load_kkov_map, get_long_format
+from src.capacity import load_capacity_index, lookup_capacities, get_group_capacities
+from src.analysis import calculate_kpis, calculate_kpis_grouped, kpis_from_row, kpis_from_stats
+from src.round_stats import summarize_rounds, merge_rounds
+from src.catalog import get_available_rounds, get_datasets, KIND_APPLICANTS
+from src.schema import SCHEMAS, resolve_schema, heuristic_schema, header_fingerprint
+from src.simulation import load_market, deferred_acceptance
+from src.similarity import school_kpi_table
 
 def run_sanity_check(year):
     print(f"\n--- SANITY CHECK FOR {year} ---")
     school_map = load_school_map()
-    izo_to_redizo = load_izo_to_redizo_map()
     raw_df = load_year_data(year)
-    capacity_dfs = {r: load_capacity_data(year, r) for r in [1, 2]}
+    capacity_index = load_capacity_index(year)
     kkov_map = load_kkov_map()
     
     long_df_all = get_long_format(raw_df, school_map, kkov_map)
     
     anomalies = []
     
-    for school_name, school_data in long_df_all.groupby('SchoolName'):
-        # Total Capacity
-        total_planned = 0
+    # Total Capacity per school (round 1 baseline)
+    school_caps = {}
+    for school_name, school_data in long_df_all.groupby('SchoolName', observed=True):
         riz_detail = str(school_data['RED_IZO'].iloc[0])
-        redizo_key = izo_to_redizo.get(riz_detail, riz_detail)
-        
-        for kkov in school_data['KKOV'].unique():
-            kkov_s = str(kkov)
-            match = capacity_dfs[1][(capacity_dfs[1]['REDIZO'] == redizo_key) & (capacity_dfs[1]['KKOV'] == kkov_s)]
-            if not match.empty:
-                total_planned += int(match['KAPACITA'].sum())
-        
-        if total_planned == 0: continue # Skip if no capacity data
+        caps = lookup_capacities(capacity_index, [(riz_detail, kkov) for kkov in school_data['KKOV'].unique()], [1])
+        school_caps[school_name] = sum(cap for cap in caps if cap)
+    
+    kpi_table = calculate_kpis_grouped(long_df_all, school_caps, by=('SchoolName',))
+    for row in kpi_table.to_dict('records'):
+        school_name = row['SchoolName']
+        if school_caps[school_name] == 0: continue # Skip if no capacity data
         
-        kpis = calculate_kpis(school_data, planned_capacity=total_planned)
+        kpis = kpis_from_row(row)
         
         # Check 1: Vacant seats vs Capacity and Admitted
         # vacant = capacity - (admitted - gave_up_if_was_admitted)
@@ -50,6 +55,116 @@ def run_sanity_check(year):
         for a in anomalies[:20]:
             print(f"  {a}")
 
+def _same(a, b):
+    if isinstance(a, dict):
+        return all(_same(a[k], b[k]) for k in a)
+    if a is None or b is None:
+        return a is None and b is None
+    return a == b or (pd.isna(a) and pd.isna(b))
+
+def check_grouped_kpis(year):
+    """Verifies calculate_kpis_grouped against per-group calculate_kpis for every school/field"""
+    print(f"\n--- GROUPED KPI CHECK FOR {year} ---")
+    raw_df = load_year_data(year)
+    long_df = get_long_format(raw_df, load_school_map(), load_kkov_map())
+    capacities = get_group_capacities(long_df, load_capacity_index(year), [1])
+    
+    kpi_table = calculate_kpis_grouped(long_df, capacities).set_index(['SchoolName', 'FieldLabel'])
+    mismatches = []
+    for key, group in long_df.groupby(['SchoolName', 'FieldLabel'], observed=True):
+        expected = calculate_kpis(group, planned_capacity=capacities.get(key))
+        actual = kpis_from_row(kpi_table.loc[key])
+        mismatches += [f"{key} {k}: {expected[k]} != {actual[k]}" for k in expected if not _same(expected[k], actual[k])]
+    
+    print(f"Skupin: {len(kpi_table)}, neshod: {len(mismatches)}")
+    for m in mismatches[:20]:
+        print(f"  {m}")
+
+def check_round_merge(year, n_rounds=3):
+    """
+    Verifies that merged per-round summaries reproduce calculate_kpis_grouped for every round
+    combination. The data has a single round per year, so students are split into pseudo-rounds.
+    """
+    print(f"\n--- ROUND MERGE CHECK FOR {year} ---")
+    school_map, kkov_map = load_school_map(), load_kkov_map()
+    raw_df = load_year_data(year).copy()
+    raw_df['kolo'] = raw_df.index % n_rounds + 1
+    raw_df = raw_df.sort_values('kolo', kind='stable').reset_index(drop=True)
+    summary = summarize_rounds(get_long_format(raw_df, school_map, kkov_map))
+    
+    for rounds in [(1,), (2,), (1, 2), (2, 3), (1, 2, 3)]:
+        long_df = get_long_format(raw_df[raw_df['kolo'].isin(rounds)], school_map, kkov_map)
+        capacities = {key: len(key[1]) for key in long_df.groupby(['SchoolName', 'FieldLabel'], observed=True).size().index}
+        live = calculate_kpis_grouped(long_df, capacities).set_index(['SchoolName', 'FieldLabel'])
+        merged = kpis_from_stats(merge_rounds(summary, rounds), capacities).set_index(['SchoolName', 'FieldLabel'])
+        merged = merged.reindex(live.index.map(lambda k: (str(k[0]), str(k[1]))))
+        mismatches = sum(not _same(a, b) for col in live.columns if col not in ('RED_IZO', 'KKOV')
+                         for a, b in zip(live[col], merged[col]))
+        print(f"Kola {rounds}: skupin {len(live)}, neshod: {mismatches}")
+
+def check_simulation(year):
+    """
+    Checks the simulated allocation: stable (no applicant prefers a group that would take them over
+    its weakest admitted) and within capacity; reports agreement with the real admissions.
+    """
+    print(f"\n--- ALLOCATION SIMULATION CHECK FOR {year} ---")
+    long_df, market = load_market(year, tuple(get_available_rounds(year)))
+    capacity = market['base_capacity']
+    admitted = deferred_acceptance(market, capacity)
+    stud, grp, pref = market['student'], market['group'], market['pref']
+    is_adm = np.zeros(len(stud), dtype=bool)
+    is_adm[admitted] = True
+    over = (np.bincount(grp[admitted], minlength=len(capacity)) > capacity).sum()
+
+    # Blocking pairs: a choice before the student's admission where the group has a free seat or a weaker admitted
+    prio = long_df['Priority'].to_numpy()[market['rows']]
+    stud_prio = np.full(stud.max() + 1, 6)
+    np.minimum.at(stud_prio, stud[is_adm], prio[is_adm])
+    worst = np.full(len(capacity), -1)
+    np.maximum.at(worst, grp[admitted], pref[admitted])
+    full = np.bincount(grp[admitted], minlength=len(capacity)) >= capacity
+    preferred = ~is_adm & (prio < stud_prio[stud])
+    blocking = (preferred & (~full[grp] | (pref < worst[grp]))).sum()
+    real = long_df['Prijat'].to_numpy()[market['rows']] == 1
+    print(f"Přihlášek: {len(stud)}, přijatých: {len(admitted)}, nad kapacitu: {over}, blokujících dvojic: {blocking}, "
+          f"shoda se skutečností: {(real == is_adm).mean() * 100:.1f} %")
+
+def check_similarity_capacity(year):
+    """School KPIs of the similarity index get the planned capacity of every school with a known field capacity"""
+    print(f"\n--- SIMILARITY CAPACITY CHECK FOR {year} ---")
+    rounds = get_available_rounds(year)
+    long_df = get_long_format(load_year_data(year), load_school_map(), load_kkov_map())
+    long_df = long_df[(long_df['RED_IZO'].astype(str) != '0').to_numpy()]
+    field_caps = get_group_capacities(long_df, load_capacity_index(year), rounds)
+    expected = {school for (school, _), cap in field_caps.items() if cap}
+    kpis = school_kpi_table(long_df, load_capacity_index(year), rounds)
+    known = int(kpis['planned_capacity'].notna().sum())
+    print(f"Škol: {len(kpis)}, se známou kapacitou oboru: {len(expected)}, s plánovanou kapacitou: {known}")
+    # The capacity feature must not silently fall back to the admitted count
+    assert known == len(expected), "planned_capacity chybí u škol se známou kapacitou oboru"
+    if expected: assert known >= 0.5 * len(kpis), "planned_capacity chybí u většiny škol"
+
+def check_schemas():
+    """Registered header schemas agree with the heuristic; reports the schema of every applicant file"""
+    print("\n--- HEADER SCHEMA CHECK ---")
+    for name, schema in SCHEMAS.items():
+        same = heuristic_schema(schema['header'])['columns'] == resolve_schema(schema['header'])['columns']
+        print(f"{name}: otisk {header_fingerprint(schema['header'])}, shoda s heuristikou: {'ANO' if same else 'NE'}")
+    for entry in get_datasets(KIND_APPLICANTS):
+        wb = openpyxl.load_workbook(entry['path'], read_only=True)
+        header = next(wb.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+        wb.close()
+        print(f"{entry['path']}: {resolve_schema(header)['schema'] or 'neznámé rozložení (heuristika)'}")
+
 if __name__ == "__main__":
+    check_schemas()
     run_sanity_check("2024")
     run_sanity_check("2025")
+    check_grouped_kpis("2024")
+    check_grouped_kpis("2025")
+    check_round_merge("2024")
+    check_round_merge("2025")
+    check_simulation("2024")
+    check_simulation("2025")
+    check_similarity_capacity("2024")
+    check_similarity_capacity("2025")
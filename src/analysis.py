@@ -1,5 +1,13 @@
 import pandas as pd
 import numpy as np
+from .utils import classify_reasons, REASON_CAPACITY, REASON_HIGHER_PRIORITY, REASON_FAILED, REASON_GAVE_UP
+from .histograms import histogram_from_points, hist_top_mean, hist_bottom_mean, hist_range_count
+
+def get_reason_codes(df):
+    """REASON_* codes of a long-format frame (pre-computed column, or classified on the fly)"""
+    if 'ReasonCode' in df.columns:
+        return df['ReasonCode'].to_numpy()
+    return classify_reasons(df['Reason'], admitted=(df['Prijat'] == 1).to_numpy())
 
 def calculate_kpis(school_data, planned_capacity=None):
     """Calculates all key metrics for a given school data subset, excluding exempt students from averages."""
@@ -9,18 +17,12 @@ def calculate_kpis(school_data, planned_capacity=None):
     total_admitted = len(admitted)
     actual_occupied = total_admitted 
     
-    # Use pre-calculated flags if available, otherwise fallback to regex (for backward compatibility)
-    if 'GaveUpSpot' in school_data.columns:
-        gave_up_total = school_data['GaveUpSpot'].sum()
-    else:
-        gave_up_mask = school_data['Reason'].str.contains('vzdal', case=False, na=False)
-        gave_up_total = len(school_data[gave_up_mask])
+    # Use the pre-classified reason enum if available, otherwise classify now (for backward compatibility)
+    reason_codes = get_reason_codes(school_data)
+    gave_up_total = (reason_codes == REASON_GAVE_UP).sum()
     
     # Calculate counts and basic indicators first
-    if 'is_capacity_reject' in school_data.columns:
-        cap_count = school_data['is_capacity_reject'].sum()
-    else:
-        cap_count = len(school_data[school_data['Reason'].str.contains('kapacit', case=False, na=False)])
+    cap_count = (reason_codes == REASON_CAPACITY).sum()
     denom_demand = max(total_admitted, planned_capacity) if planned_capacity and planned_capacity > 0 else total_admitted
     pure_demand_idx = ((total_admitted + cap_count) / denom_demand) if denom_demand > 0 else 0
     
@@ -55,26 +57,17 @@ def calculate_kpis(school_data, planned_capacity=None):
     # Elite (Top 10% of applicants in the field - ignoring exempts for avg?)
     # Usually "Elite" refers to high performers, so regular students.
     top_10_count = max(1, round(total_apps * 0.1))
-    # Filter regular for elite avg calculation
+    # Filter regular for elite avg calculation (fixed-bin histogram instead of sorting, see src/histograms.py)
     regular_apps = school_data[~school_data['IsExempt']]
-    elite_avg = regular_apps.sort_values('TotalPoints', ascending=False).head(top_10_count)['TotalPoints'].mean() if not regular_apps.empty else None
+    elite_avg = hist_top_mean(histogram_from_points(regular_apps['TotalPoints']), top_10_count)
     
     # Rejected Metrics Helper
-    rejected = school_data[school_data['Prijat'] != 1]
+    rejected_mask = (school_data['Prijat'] != 1).to_numpy()
+    rejected = school_data[rejected_mask]
+    rejected_codes = reason_codes[rejected_mask]
     
-    def get_reject_stats_struct(reason_pattern):
-        col_map = {
-            'kapacit': 'is_capacity_reject',
-            'vyssi_priorit|vyssi prioritu': 'is_lost_priority',
-            'nespln|neprosp|nesplnil|nedosah|kriteri': 'is_failure'
-        }
-        flag_col = col_map.get(reason_pattern)
-        
-        if flag_col and flag_col in rejected.columns:
-            subset = rejected[rejected[flag_col] == True]
-        else:
-            subset = rejected[rejected['Reason'].str.contains(reason_pattern, case=False, na=False)]
-            
+    def get_reject_stats_struct(reason_code):
+        subset = rejected[rejected_codes == reason_code]
         exempt = subset[subset['IsExempt']]
         regular = subset[~subset['IsExempt']]
         
@@ -89,9 +82,9 @@ def calculate_kpis(school_data, planned_capacity=None):
             'total': len(subset)
         }
 
-    cap_stats = get_reject_stats_struct('kapacit')
-    lost_stats = get_reject_stats_struct('vyssi_priorit|vyssi prioritu')
-    fail_stats = get_reject_stats_struct('nespln|neprosp|nesplnil|nedosah|kriteri')
+    cap_stats = get_reject_stats_struct(REASON_CAPACITY)
+    lost_stats = get_reject_stats_struct(REASON_HIGHER_PRIORITY)
+    fail_stats = get_reject_stats_struct(REASON_FAILED)
     
     # cap_count and pure_demand_idx are already calculated at the top
     cap_reject_rate = (cap_count / total_apps * 100) if total_apps > 0 else 0
@@ -104,7 +97,6 @@ def calculate_kpis(school_data, planned_capacity=None):
     lost_avg_val = lost_stats['avg_reg']
     talent_gap = (lost_avg_val - avg_admitted_val) if (lost_avg_val is not None and avg_admitted_val is not None) else 0
 
-    not_passed = school_data['Reason'].str.contains('nespln|neprosp|nesplnil|nedosah|kriteri', case=False, na=False)
     # pure_demand_idx is already calculated at the top
     
     # Pre-calculate counts for new strategic metrics
@@ -132,12 +124,12 @@ def calculate_kpis(school_data, planned_capacity=None):
 
     # Bottom 25% of admitted (Regular only)
     bottom_25_count = max(1, round(len(regular_admitted) * 0.25))
-    bottom_25_avg = regular_admitted.sort_values('TotalPoints', ascending=True).head(bottom_25_count)['TotalPoints'].mean() if not regular_admitted.empty else None
+    bottom_25_avg = hist_bottom_mean(histogram_from_points(regular_admitted['TotalPoints']), bottom_25_count)
 
-    # Boundary Density
+    # Boundary Density (applications within +-5 points of the minimum, read from the 0.5-point histogram)
     boundary_density = 0
     if min_score is not None and pure_demand_idx > 1.0:
-        boundary_density = len(school_data[(school_data['TotalPoints'] >= min_score - 5) & (school_data['TotalPoints'] <= min_score + 5)])
+        boundary_density = hist_range_count(histogram_from_points(school_data['TotalPoints']), min_score - 5, min_score + 5)
     else:
         boundary_density = None
 
@@ -180,19 +172,210 @@ def calculate_kpis(school_data, planned_capacity=None):
         'fail_stats': fail_stats, # New struct
     }
 
+# Scalar KPIs of calculate_kpis that are None when undefined (NaN in the grouped table)
+OPTIONAL_KPIS = ('planned_capacity', 'min_score', 'avg_admitted', 'elite_avg', 'bottom_25_avg',
+                 'boundary_density', 'cap_avg', 'lost_avg', 'fail_avg')
+
+# Struct KPIs of calculate_kpis -> prefix of their flattened columns in the grouped table
+KPI_STRUCTS = {'avg_admitted_struct': 'adm', 'cap_stats': 'cap', 'lost_stats': 'lost', 'fail_stats': 'fail'}
+
+def _group_sum(gid, mask, values, n_groups):
+    """Per-group (count, sum) of values where mask holds, NaN values ignored like pandas"""
+    mask = mask & ~np.isnan(values)
+    cnt = np.bincount(gid[mask], minlength=n_groups)
+    total = np.bincount(gid[mask], weights=values[mask], minlength=n_groups)
+    return cnt, total
+
+def _safe_mean(cnt, total):
+    """Mean from (count, sum), NaN for empty groups"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(cnt > 0, total / np.maximum(cnt, 1), np.nan)
+
+def ranked_sum(gid, values, mask, k, n_groups, ascending):
+    """Per-group (count, sum) of the k lowest/highest values among rows where mask holds (sort + rank)"""
+    g, v = gid[mask], values[mask]
+    order = np.lexsort((v if ascending else -v, g))
+    g, v = g[order], v[order]
+    rank = np.arange(len(g)) - np.searchsorted(g, g, side='left')
+    return _group_sum(g, rank < k[g], v, n_groups)
+
+# Reject reasons with their own (count, average) statistics
+REJECT_STATS = (('cap', REASON_CAPACITY), ('lost', REASON_HIGHER_PRIORITY), ('fail', REASON_FAILED))
+
+def elite_size(total_apps):
+    """Number of applications forming the top 10 % (at least one)"""
+    return np.maximum(1, np.round(np.asarray(total_apps) * 0.1))
+
+def bottom_size(regular_admitted):
+    """Number of regular admitted forming the bottom 25 % (at least one)"""
+    return np.maximum(1, np.round(np.asarray(regular_admitted) * 0.25))
+
+def group_kpi_stats(long_df, by=('SchoolName', 'FieldLabel')):
+    """
+    Sufficient statistics of every group for the KPIs (counts, point sums, minimum,
+    top 10 % / bottom 25 % sums and the boundary count), indexed by the group columns.
+    """
+    by = list(by)
+    grouped = long_df.groupby(by, observed=True, sort=True)
+    gid = grouped.ngroup().to_numpy()
+    stats = grouped[['RED_IZO', 'KKOV']].first()
+    n = len(stats)
+
+    pts = long_df['TotalPoints'].to_numpy(dtype='float64')
+    exempt = long_df['IsExempt'].to_numpy(dtype=bool)
+    adm = (long_df['Prijat'] == 1).to_numpy()
+    prio = long_df['Priority'].to_numpy()
+    codes = get_reason_codes(long_df)
+
+    def count(mask):
+        return np.bincount(gid[mask], minlength=n)
+
+    stats['total_apps'] = count(np.ones(len(long_df), dtype=bool))
+    stats['total_admitted'] = count(adm)
+    stats['gave_up_count'] = count(codes == REASON_GAVE_UP)
+    stats['cap_count'] = count(codes == REASON_CAPACITY)
+
+    # Admitted (regular only for averages)
+    reg_adm = adm & ~exempt
+    stats['adm_cnt_reg'] = count(reg_adm)
+    stats['adm_cnt_exc'] = count(adm & exempt)
+    stats['adm_sum_reg'] = _group_sum(gid, reg_adm, pts, n)[1]
+    min_score = pd.Series(pts[reg_adm]).groupby(gid[reg_adm]).min().reindex(range(n)).to_numpy()
+    stats['min_score'] = min_score
+
+    # Elite: top 10 % of all applications, averaged over regular applicants; bottom 25 % of regular admitted
+    stats['elite_cnt'], stats['elite_sum'] = ranked_sum(gid, pts, ~exempt, elite_size(stats['total_apps']), n, ascending=False)
+    stats['bottom_cnt'], stats['bottom_sum'] = ranked_sum(gid, pts, reg_adm, bottom_size(stats['adm_cnt_reg']), n, ascending=True)
+
+    # Rejection stats per reason
+    for prefix, code in REJECT_STATS:
+        subset = ~adm & (codes == code)
+        stats[f'{prefix}_cnt_reg'] = count(subset & ~exempt)
+        stats[f'{prefix}_cnt_exc'] = count(subset & exempt)
+        stats[f'{prefix}_sum_reg'] = _group_sum(gid, subset & ~exempt, pts, n)[1]
+        stats[f'{prefix}_total'] = count(subset)
+
+    stats['p1_count'] = count(prio == 1)
+    stats['p1_admitted'] = count((prio == 1) & adm)
+    stats['intake_p3p_count'] = count(adm & (prio >= 3))
+
+    # Boundary density: applications within +-5 points of the group's minimum
+    row_min = min_score[gid]
+    stats['boundary_count'] = count((pts >= row_min - 5) & (pts <= row_min + 5))
+    return stats
+
+def kpis_from_stats(stats, capacities=None):
+    """
+    KPI table (see calculate_kpis_grouped) from per-group sufficient statistics.
+    capacities: {group key: planned capacity or None}, keys matching the stats index.
+    """
+    def col(name):
+        return stats[name].to_numpy()
+
+    total_apps, total_admitted, cap_count = col('total_apps'), col('total_admitted'), col('cap_count')
+    cap = np.array([np.nan if (c := (capacities or {}).get(key)) is None else c for key in stats.index], dtype='float64')
+    has_cap = cap > 0
+
+    denom_demand = np.where(has_cap, np.fmax(total_admitted, cap), total_admitted)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pure_demand_idx = np.where(denom_demand > 0, (total_admitted + cap_count) / denom_demand, 0)
+        success_rate = np.where(pure_demand_idx <= 1.0, 100.0, total_admitted / total_apps * 100)
+        denom = np.where(has_cap, cap, total_admitted)
+        comp_idx = np.where(denom > 0, total_apps / denom, 0)
+        fullness_rate = np.where(has_cap, total_admitted / cap * 100, 100)
+    vacant_seats = np.where(np.isnan(cap), 0, np.fmax(0, cap - total_admitted)).astype('int64')
+
+    min_score = col('min_score')
+    avg_admitted = _safe_mean(col('adm_cnt_reg'), col('adm_sum_reg'))
+    result = {
+        'total_apps': total_apps,
+        'total_admitted': total_admitted,
+        'gave_up_count': col('gave_up_count'),
+        'planned_capacity': cap,
+        'fullness_rate': fullness_rate,
+        'vacant_seats': vacant_seats,
+        'success_rate': success_rate,
+        'comp_idx': comp_idx,
+        'min_score': min_score,
+        'avg_admitted': avg_admitted,
+        'adm_cnt_reg': col('adm_cnt_reg'),
+        'adm_cnt_exc': col('adm_cnt_exc'),
+        'elite_avg': _safe_mean(col('elite_cnt'), col('elite_sum')),
+        'bottom_25_avg': _safe_mean(col('bottom_cnt'), col('bottom_sum')),
+    }
+    for prefix, _ in REJECT_STATS:
+        result[f'{prefix}_cnt_reg'] = col(f'{prefix}_cnt_reg')
+        result[f'{prefix}_cnt_exc'] = col(f'{prefix}_cnt_exc')
+        result[f'{prefix}_avg'] = _safe_mean(col(f'{prefix}_cnt_reg'), col(f'{prefix}_sum_reg'))
+        result[f'{prefix}_total'] = col(f'{prefix}_total')
+
+    p1_count = col('p1_count')
+    lost_avg, lost_count = result['lost_avg'], result['lost_total']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['cap_reject_rate'] = np.where(total_apps > 0, cap_count / total_apps * 100, 0)
+        result['p1_loyalty'] = np.where(p1_count > 0, col('p1_admitted') / p1_count * 100, 0)
+        result['talent_gap'] = np.where(np.isnan(lost_avg) | np.isnan(avg_admitted), 0, lost_avg - avg_admitted)
+        result['pure_demand_idx'] = pure_demand_idx
+
+        denom_cap = np.where(has_cap, np.fmax(1, cap), total_apps)
+        result['interest_p1_pct'] = np.where(denom_cap > 0, p1_count / denom_cap * 100, 0)
+        result['intake_p1_pct'] = np.where(denom_cap > 0, col('p1_admitted') / denom_cap * 100, 0)
+        result['intake_p3p_pct'] = np.where(denom_cap > 0, col('intake_p3p_count') / denom_cap * 100, 0)
+        outflow = total_admitted + lost_count
+        result['release_rate'] = np.where(outflow > 0, lost_count / outflow * 100, 0)
+
+    # Boundary density only for over-demanded groups with a known minimum
+    boundary_density = col('boundary_count').astype('float64')
+    boundary_density[np.isnan(min_score) | (pure_demand_idx <= 1.0)] = np.nan
+    result['boundary_density'] = boundary_density
+
+    result['cap_count'] = cap_count
+    result['lost_count'] = lost_count
+    result['fail_count'] = result['fail_total']
+
+    table = stats[['RED_IZO', 'KKOV']].reset_index()
+    return pd.concat([table, pd.DataFrame(result)], axis=1)
+
+def calculate_kpis_grouped(long_df, capacities=None, by=('SchoolName', 'FieldLabel')):
+    """
+    calculate_kpis for every group of a long-format frame in one pass.
+    capacities: {group key: planned capacity or None} (see capacity.get_group_capacities).
+    Returns one row per group with the group columns, RED_IZO/KKOV of the group and all scalar KPIs;
+    struct KPIs are flattened to <prefix>_cnt_reg / _cnt_exc columns, undefined values are NaN.
+    """
+    if long_df.empty: return pd.DataFrame(columns=list(by))
+    return kpis_from_stats(group_kpi_stats(long_df, by), capacities)
+
+def kpis_from_row(row):
+    """Rebuilds the calculate_kpis dictionary from one row of calculate_kpis_grouped"""
+    row = dict(row)
+    kpis = dict(row)
+    for key in OPTIONAL_KPIS:
+        if key in kpis and pd.isna(kpis[key]):
+            kpis[key] = None
+    if kpis.get('planned_capacity') is not None:
+        kpis['planned_capacity'] = int(kpis['planned_capacity'])
+    for struct, prefix in KPI_STRUCTS.items():
+        avg_key = 'avg_admitted' if prefix == 'adm' else f'{prefix}_avg'
+        kpis[struct] = {'cnt_reg': int(row[f'{prefix}_cnt_reg']), 'avg_reg': kpis[avg_key], 'cnt_exc': int(row[f'{prefix}_cnt_exc'])}
+        if prefix != 'adm':
+            kpis[struct]['total'] = int(row[f'{prefix}_total'])
+    return kpis
+
+def add_ranks(df, by=('SchoolName', 'FieldLabel')):
+    """
+    Adds Rank (1 = most points) and Percentile (Rank / group size * 100) within every group.
+    One stable sort + cumcount for all groups; rows come back grouped and ordered by rank.
+    """
+    if df.empty: return df
+    by = list(by)
+    ranked = df.sort_values(by + ['TotalPoints'], ascending=[True] * len(by) + [False], kind='stable')
+    grouped = ranked.groupby(by, observed=True, sort=False)
+    ranked['Rank'] = grouped.cumcount().to_numpy() + 1
+    ranked['Percentile'] = (ranked['Rank'] / grouped['TotalPoints'].transform('size') * 100).round(1)
+    return ranked
+
 def get_decile_data(df):
     """Normalizes rank to percentiles (0-100) for decile chart comparison"""
     if df.empty: return df
-    
-    res_list = []
-    groups = df.groupby(['SchoolName', 'FieldLabel'])
-    for name, group in groups:
-        group_s = group.sort_values('TotalPoints', ascending=False).reset_index(drop=True)
-        # Percentile: (index / (len-1)) * 100 if len > 1 else 0
-        # Actually user said "100% would be the count of students of school with highest/lowest...?"
-        # Let's use rank / total_in_group * 100 for normalization.
-        n = len(group_s)
-        group_s['Percentile'] = ((group_s.index + 1) / n * 100).round(1)
-        res_list.append(group_s)
-    
-    return pd.concat(res_list, ignore_index=True) if res_list else pd.DataFrame()
+    return add_ranks(df).reset_index(drop=True)
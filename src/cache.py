@@ -0,0 +1,89 @@
+import os
+import hashlib
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+CACHE_DIR = '.cache'
+
+# Content hashes of source files, reused while size and mtime are unchanged (same rule as the build manifest)
+_hash_cache = {}
+
+def file_sha1(path, stat=None):
+    """SHA-1 of the file content; the file is read again only when its size or mtime changed"""
+    stat = stat or os.stat(path)
+    key = os.path.abspath(path)
+    cached = _hash_cache.get(key)
+    if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    _hash_cache[key] = (stat.st_size, stat.st_mtime_ns, h.hexdigest())
+    return _hash_cache[key][2]
+
+def file_fingerprint(path):
+    """Builds a cache key from the source file's size, mtime and content hash"""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}-{file_sha1(path, stat)[:16]}"
+
+def get_cache_path(namespace, source_path, fingerprint, ext='arrow'):
+    """Returns the on-disk location of a cached artifact derived from source_path"""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(CACHE_DIR, namespace, f"{stem}-{fingerprint}.{ext}")
+
+def _remove_stale(cache_path):
+    """Deletes older cache files of the same source (different fingerprint)"""
+    folder = os.path.dirname(cache_path)
+    stem = os.path.basename(cache_path).rsplit('-', 3)[0]
+    for f in os.listdir(folder):
+        full = os.path.join(folder, f)
+        if full != cache_path and f.rsplit('-', 3)[0] == stem:
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+
+def write_frame(df, cache_path):
+    """Writes a DataFrame as an uncompressed Arrow IPC file (memory-mappable)"""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = cache_path + '.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    # Atomic swap so a concurrent reader never sees a half-written file
+    os.replace(tmp_path, cache_path)
+    _remove_stale(cache_path)
+
+def read_frame(cache_path):
+    """Loads a cached Arrow IPC file through a memory map"""
+    with pa.memory_map(cache_path, 'r') as source:
+        table = ipc.open_file(source).read_all()
+    df = table.to_pandas()
+    # Arrow restores nulls in object columns as None; keep NaN like pd.read_excel does
+    obj_cols = [c for c in df.columns if df[c].dtype == object and df[c].hasnans]
+    for col in obj_cols:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+def load_cached_frame(source_path, namespace, builder):
+    """
+    Returns builder(source_path) from the columnar cache, building it on first use.
+    The cache entry is keyed by the source fingerprint, so replacing the source file
+    transparently invalidates it. Frames Arrow cannot represent are returned uncached.
+    """
+    cache_path = get_cache_path(namespace, source_path, file_fingerprint(source_path))
+    if os.path.exists(cache_path):
+        try:
+            return read_frame(cache_path)
+        except (OSError, pa.ArrowException):
+            pass  # Corrupted entry - rebuild below
+
+    df = builder(source_path)
+    try:
+        write_frame(df, cache_path)
+    except (OSError, pa.ArrowException, TypeError, ValueError) as e:
+        print(f"Cache nelze zapsat pro {source_path}: {e}")
+    return df
@@ -0,0 +1,75 @@
+import streamlit as st
+from .data_loader import load_capacity_data, load_izo_to_redizo_map, REGION_COL
+from .catalog import get_available_rounds, KIND_CAPACITIES
+
+def build_capacity_index(cap_dfs, izo_to_redizo):
+    """
+    Indexes capacity tables by (REDIZO, KKOV, round) -> summed KAPACITA, plus REDIZO -> region.
+    cap_dfs: {round: DataFrame with REDIZO, KKOV, KAPACITA} as returned by load_capacity_data.
+    The IZO -> REDIZO translation is kept in the index so lookups accept facility IZOs.
+    """
+    capacity = {}
+    regions = {}
+    rounds = set()
+    for round_num, df in cap_dfs.items():
+        if df is None or df.empty or 'REDIZO' not in df.columns: continue
+        sums = df.groupby(['REDIZO', 'KKOV'])['KAPACITA'].sum()
+        capacity.update({(redizo, kkov, round_num): int(cap) for (redizo, kkov), cap in sums.items()})
+        if REGION_COL in df.columns:
+            regions.update(df.dropna(subset=[REGION_COL]).drop_duplicates('REDIZO').set_index('REDIZO')[REGION_COL].astype(str).to_dict())
+        rounds.add(round_num)
+    return {'capacity': capacity, 'regions': regions, 'rounds': rounds, 'izo_to_redizo': izo_to_redizo}
+
+@st.cache_resource
+def load_capacity_index(year):
+    """Capacity index of all capacity rounds available for a year (shared, read-only)"""
+    rounds = get_available_rounds(year, KIND_CAPACITIES)
+    return build_capacity_index({r: load_capacity_data(year, r) for r in rounds}, load_izo_to_redizo_map())
+
+def get_target_round(selected_rounds):
+    """Baseline rule: round 1 capacity if 1. kolo is selected, otherwise the first selected round"""
+    return 1 if 1 in selected_rounds else selected_rounds[0]
+
+def lookup_capacities(index, groups, selected_rounds):
+    """
+    Batch lookup of planned capacities for (RED_IZO or IZO, KKOV) pairs.
+    Facility IZOs are translated to institution REDIZOs; the original id is tried as a fallback.
+    Returns a list aligned with groups (None where no capacity is known).
+    """
+    groups = list(groups)
+    if not selected_rounds or not index or not index['rounds']:
+        return [None] * len(groups)
+    target_round = get_target_round(selected_rounds)
+    if target_round not in index['rounds']:
+        return [None] * len(groups)
+
+    capacity, izo_to_redizo = index['capacity'], index['izo_to_redizo']
+    result = []
+    for riz, kkov in groups:
+        riz_str, kkov_str = str(riz), str(kkov).strip()
+        redizo = izo_to_redizo.get(riz_str, riz_str)
+        cap = capacity.get((redizo, kkov_str, target_round))
+        if cap is None and redizo != riz_str:
+            cap = capacity.get((riz_str, kkov_str, target_round))
+        result.append(cap)
+    return result
+
+def lookup_regions(index, schools):
+    """Region (kraj) of every RED_IZO / IZO in schools, None where the capacity files do not list it"""
+    regions, izo_to_redizo = (index or {}).get('regions', {}), (index or {}).get('izo_to_redizo', {})
+    result = []
+    for riz in schools:
+        riz_str = str(riz)
+        result.append(regions.get(izo_to_redizo.get(riz_str, riz_str), regions.get(riz_str)))
+    return result
+
+def get_planned_capacity(index, riz, kkov, selected_rounds):
+    """Planned capacity for a single school and field (see lookup_capacities)"""
+    return lookup_capacities(index, [(riz, kkov)], selected_rounds)[0]
+
+def get_group_capacities(long_df, index, selected_rounds, by=('SchoolName', 'FieldLabel')):
+    """Planned capacity of every group in a long-format frame, keyed by the group tuple"""
+    if long_df.empty: return {}
+    firsts = long_df.groupby(list(by), observed=True)[['RED_IZO', 'KKOV']].first()
+    caps = lookup_capacities(index, zip(firsts['RED_IZO'], firsts['KKOV']), selected_rounds)
+    return dict(zip(firsts.index, caps))
@@ -0,0 +1,60 @@
+import os
+import re
+
+# Cermat exports: PZ{year}_kolo{round}_{kind}.xlsx
+DATASET_PATTERN = re.compile(r'^PZ(\d{4})_kolo(\d+)_(uchazeci_prihlasky_vysledky|skolobory_kapacity)\.xlsx$', re.IGNORECASE)
+
+KIND_APPLICANTS = 'applicants'
+KIND_CAPACITIES = 'capacities'
+
+_KIND_BY_SUFFIX = {
+    'uchazeci_prihlasky_vysledky': KIND_APPLICANTS,
+    'skolobory_kapacity': KIND_CAPACITIES,
+}
+
+# Catalog is rebuilt only when the data directory changes (files added/removed/renamed)
+_catalog_cache = {'key': None, 'entries': []}
+
+def classify_file(filename):
+    """Returns {'path', 'kind', 'year', 'round'} for a Cermat export, or None for unrelated files"""
+    m = DATASET_PATTERN.match(os.path.basename(filename))
+    if not m: return None
+    return {
+        'path': filename,
+        'kind': _KIND_BY_SUFFIX[m.group(3).lower()],
+        'year': m.group(1),
+        'round': int(m.group(2)),
+    }
+
+def get_catalog(root='.'):
+    """Lists all recognized dataset files in root, cached until the directory is modified"""
+    key = (os.path.abspath(root), os.stat(root).st_mtime_ns)
+    if _catalog_cache['key'] != key:
+        entries = []
+        for f in os.listdir(root):
+            entry = classify_file(os.path.join(root, f))
+            if entry: entries.append(entry)
+        entries.sort(key=lambda e: (e['year'], e['round'], e['kind']))
+        _catalog_cache['key'] = key
+        _catalog_cache['entries'] = entries
+    return _catalog_cache['entries']
+
+def get_datasets(kind, year=None, round_num=None, root='.'):
+    """Filters the catalog by kind and optionally by year and round"""
+    return [e for e in get_catalog(root)
+            if e['kind'] == kind
+            and (year is None or e['year'] == str(year))
+            and (round_num is None or e['round'] == int(round_num))]
+
+def get_dataset_path(kind, year, round_num, root='.'):
+    """Path of the single file for (kind, year, round), or None if missing"""
+    matches = get_datasets(kind, year, round_num, root)
+    return matches[0]['path'] if matches else None
+
+def get_available_years(kind=KIND_APPLICANTS, root='.'):
+    """Years with data of the given kind, newest first (as strings, like the file names)"""
+    return sorted({e['year'] for e in get_datasets(kind, root=root)}, reverse=True)
+
+def get_available_rounds(year, kind=KIND_APPLICANTS, root='.'):
+    """Sorted round numbers available for a year"""
+    return sorted({e['round'] for e in get_datasets(kind, year, root=root)})
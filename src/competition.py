@@ -0,0 +1,124 @@
+import os
+from itertools import product
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .cache import get_cache_path, read_frame, write_frame
+from .data_loader import load_year_data, load_school_map, load_kkov_map, _school_codes
+from .kpi_cube import CUBE_NAMESPACE, get_cube_fingerprint
+
+# Weight of an application by its priority slot (1st choice counts most)
+PRIORITY_WEIGHTS = {1: 1.0, 2: 0.8, 3: 0.6, 4: 0.4, 5: 0.2}
+
+# Rival schools of a school, and rival fields (school, KKOV) of a school's applicants
+LEVEL_SCHOOL = 'school'
+LEVEL_FIELD = 'field'
+
+def _slot_entities(df_wide, school_map):
+    """
+    Incidence of students and entities per priority slot: (slots, school ids, field ids) where
+    ids are factorized codes (-1 for an empty slot). Schools are keyed by their display name
+    (SchoolName of the long format), so all RED_IZOs of one school form a single entity;
+    fields are (school, KKOV) like the (SchoolName, FieldLabel) groups.
+    """
+    slots = [i for i in range(1, 6) if f'ss{i}_redizo' in df_wide.columns]
+    riz = np.column_stack([_school_codes(df_wide, f'ss{i}_redizo') for i in slots])
+    kkov = np.column_stack([df_wide[f'ss{i}_kkov'].astype(str).to_numpy() if f'ss{i}_kkov' in df_wide.columns
+                            else np.full(len(df_wide), 'nan', dtype=object) for i in slots])
+    empty = riz == 0
+
+    # Names once per unique RED_IZO (same fallback label as get_long_format)
+    str_school_map = {str(k): v for k, v in school_map.items()}
+    riz_codes, riz_uniques = pd.factorize(riz.ravel())
+    riz_names = np.array([str_school_map.get(str(r), f"Neznámá škola ({r})") for r in riz_uniques], dtype=object)
+    names = riz_names[riz_codes]
+
+    school_codes, schools = pd.factorize(names)
+    field_codes, fields = pd.MultiIndex.from_arrays([names, kkov.ravel()]).factorize()
+    school_ids = np.where(empty, -1, school_codes.reshape(riz.shape))
+    field_ids = np.where(empty, -1, field_codes.reshape(riz.shape))
+    school_table = pd.DataFrame({'school': np.asarray(schools, dtype=object), 'kkov': ''})
+    field_table = pd.DataFrame({'school': fields.get_level_values(0).astype(str), 'kkov': fields.get_level_values(1).astype(str)})
+    return slots, (school_ids, school_table), (field_ids, field_table)
+
+def co_application_pairs(a_ids, b_ids, slots):
+    """
+    Co-application matrix C = A^T W B of the student x entity incidences A and B, computed by
+    expanding every (slot i, slot j) pair of each student instead of a sparse product.
+    Returns (a, b, count, weight): count = distinct students with an application to both a and b,
+    weight = sum over those students of their best w(p_i) * w(p_j). With A = B the diagonal
+    (a, a) holds the distinct applicants of a.
+    """
+    n_students = a_ids.shape[0]
+    w = np.array([PRIORITY_WEIGHTS[s] for s in slots])
+    students = np.arange(n_students)
+    parts = []
+    for i, j in product(range(len(slots)), repeat=2):
+        a, b = a_ids[:, i], b_ids[:, j]
+        ok = (a >= 0) & (b >= 0)
+        parts.append(pd.DataFrame({'student': students[ok], 'a': a[ok], 'b': b[ok], 'weight': np.full(ok.sum(), w[i] * w[j])}))
+
+    pairs = pd.concat(parts, ignore_index=True).groupby(['student', 'a', 'b'], sort=False)['weight'].max().reset_index()
+    return pairs.groupby(['a', 'b']).agg(count=('student', 'size'), weight=('weight', 'sum')).reset_index()
+
+def build_co_application(df_wide, school_map):
+    """
+    Co-application tables keyed by school name: school x school (diagonal = distinct applicants
+    of the school) and school x field (fields applied to by the school's applicants)
+    """
+    if df_wide.empty: return pd.DataFrame()
+    slots, (school_ids, schools), (field_ids, fields) = _slot_entities(df_wide, school_map)
+    tables = []
+    for level, b_ids, entities in ((LEVEL_SCHOOL, school_ids, schools), (LEVEL_FIELD, field_ids, fields)):
+        pairs = co_application_pairs(school_ids, b_ids, slots)
+        b = entities.iloc[pairs['b']].reset_index(drop=True)
+        tables.append(pd.DataFrame({
+            'level': level,
+            'a_school': schools['school'].iloc[pairs['a']].to_numpy(),
+            'b_school': b['school'], 'b_kkov': b['kkov'],
+            'count': pairs['count'].to_numpy(), 'weight': pairs['weight'].to_numpy().round(4),
+        }))
+    return pd.concat(tables, ignore_index=True)
+
+def get_co_application_path(year):
+    return get_cache_path(CUBE_NAMESPACE, f"PZ{year}_rivals", get_cube_fingerprint(year))
+
+def write_co_application(year):
+    """Persists the co-application tables of a year (all rounds); returns the file path"""
+    path = get_co_application_path(year)
+    write_frame(build_co_application(load_year_data(year), load_school_map()), path)
+    return path
+
+@st.cache_resource
+def load_co_application(year):
+    """Co-application tables indexed by (level, a_school); built and persisted on first use"""
+    path = get_co_application_path(year)
+    table = read_frame(path) if os.path.exists(path) else None
+    if table is None:
+        table = build_co_application(load_year_data(year), load_school_map())
+        if table.empty: return table
+        write_frame(table, path)
+    return table.set_index(['level', 'a_school']).sort_index()
+
+def top_competitors(coapp, school, level=LEVEL_SCHOOL, n=10):
+    """
+    Strongest competitors of a school (SchoolName): rival schools or rival fields of other schools.
+    Returns overlap counts, their share of the school's distinct applicants and the priority-weighted score.
+    """
+    if coapp is None or coapp.empty or (level, school) not in coapp.index: return pd.DataFrame()
+    rows = coapp.loc[[(level, school)]].reset_index(drop=True)
+    own = coapp.loc[[(LEVEL_SCHOOL, school)]]
+    applicants = own.loc[own['b_school'] == school, 'count'].sum()
+    rivals = rows[rows['b_school'] != school][['b_school', 'b_kkov', 'count', 'weight']]
+    rivals = rivals.sort_values(['weight', 'count'], ascending=False).head(n)
+    rivals['share'] = rivals['count'] / applicants * 100 if applicants else 0.0
+    return rivals.reset_index(drop=True)
+
+def label_competitors(rivals, level=LEVEL_SCHOOL):
+    """Adds display names (same labels as SchoolName / FieldLabel of the long format)"""
+    if rivals.empty: return rivals
+    names = rivals['b_school'].astype(str).tolist()
+    if level == LEVEL_FIELD:
+        kkov_map = load_kkov_map()
+        names = [f"{name} – {kkov_map.get(k, k)} ({k})" for name, k in zip(names, rivals['b_kkov'])]
+    return rivals.assign(name=names)
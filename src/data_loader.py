@@ -1,104 +1,28 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
-import re
 import json
-from .utils import clean_col_name, get_grade_level
-
-def normalize_column_name(col):
-    """Normalize 2024 mangled columns to 2025 standard names with robust string matching"""
-    original = str(col)
-    c = clean_col_name(col)
-    
-    # 1. Subject Scores
-    if ('jl' in c and 'procent' in c) or ('jl' in c and 'lep' in c):
-        return 'c_procentni_skor'
-    if ('ma' in c and 'procent' in c) or ('ma' in c and 'lep' in c):
-        return 'm_procentni_skor'
-    
-    # 2. Priority Columns (ss1..ss5)
-    match = re.search(r's(\d)', c) or re.search(r's(\d)', c) # Handle cases where regex might fail due to mangling
-    # Fallback to simple indices if digit is near 's'
-    if not match:
-        for i in range(1, 6):
-            if f's{i}' in c or f's{i}' in c: 
-                idx = str(i)
-                break
-        else: idx = None
-    else: idx = match.group(1)
-
-    if idx:
-        new_prefix = f'ss{idx}_'
-        if 'izo' in c or 'redizo' in c: return f'{new_prefix}redizo'
-        if 'kkov' in c or 'obor' in c or 'kd' in c: return f'{new_prefix}kkov'
-        if 'prijat' in c or 'pijat' in c: return f'{new_prefix}prijat'
-        if 'duvod' in c: return f'{new_prefix}duvod_neprijeti'
-    
-    if 'kolo' in c: return 'kolo'
-    if 'rok' in c: return 'rok'
-    
-    return original
+import openpyxl
+from .utils import get_grade_level, classify_reasons
+from .schema import normalize_column_name, resolve_schema
+from .cache import load_cached_frame
+from .school_register import load_school_register
+from .catalog import get_datasets, get_dataset_path, get_available_rounds, KIND_APPLICANTS, KIND_CAPACITIES
 
 @st.cache_data
 def load_school_map():
     """Loads the school mapping (both RED_IZO and IZO -> Names)"""
-    try:
-        df = pd.read_csv('skoly.csv', encoding='cp1250', sep=';', low_memory=False)
-    except:
-        df = pd.read_csv('skoly.csv', encoding='utf-8', sep=';', low_memory=False)
-    
-    mapping = {}
-    df['is_school'] = df['Nazev'].fillna('').astype(str).str.contains('škola|Gymnázium|Lyceum', case=False)
-    # Sort: put actual schools at the top so we pick their name first
-    df = df.sort_values(by=['is_school'], ascending=False)
-
-    for _, row in df.iterrows():
-        try:
-            riz = int(float(row['RED_IZO']))
-            iz = int(float(row['IZO']))
-            
-            short_name = str(row['Zkraceny_nazev']).strip()
-            name_vessel = str(row['Nazev']).strip()
-            full_name = str(row['Plny_nazev']).strip()
-            
-            final_name = full_name
-            if not final_name or final_name.lower() == 'nan':
-                 final_name = name_vessel
-
-            misto = str(row['Misto']).strip() if 'Misto' in row and pd.notna(row['Misto']) else ""
-            if misto and misto.lower() not in final_name.lower():
-                final_name = f"{final_name} ({misto})"
-            
-            # Add to map using both RED_IZO and IZO keys
-            if riz not in mapping: mapping[riz] = final_name
-            if iz not in mapping: mapping[iz] = final_name
-        except:
-            continue
-    return mapping
+    register = load_school_register()
+    return dict(zip(register['key'].tolist(), register['name'].astype(object).tolist()))
 
 @st.cache_data
 def load_izo_to_redizo_map():
     """Builds IZO (facility) → REDIZO (institution) mapping from skoly.csv.
     Student data uses facility IZOs in the ss_redizo columns, while capacity
     files use institution-level REDIZOs. This mapping translates between them."""
-    try:
-        df = pd.read_csv('skoly.csv', encoding='cp1250', sep=';', low_memory=False)
-    except:
-        df = pd.read_csv('skoly.csv', encoding='utf-8', sep=';', low_memory=False)
-    
-    izo_to_redizo = {}
-    for _, row in df.iterrows():
-        try:
-            riz = str(int(float(row['RED_IZO'])))
-            iz = str(int(float(row['IZO'])))
-            if iz not in izo_to_redizo:
-                izo_to_redizo[iz] = riz
-            # Also map REDIZO to itself for schools where the data already uses REDIZO
-            if riz not in izo_to_redizo:
-                izo_to_redizo[riz] = riz
-        except:
-            continue
-    return izo_to_redizo
+    register = load_school_register()
+    return dict(zip(register['key'].astype(str).tolist(), register['redizo'].astype(str).tolist()))
 
 @st.cache_data
 def load_kkov_map():
@@ -108,73 +32,119 @@ def load_kkov_map():
             return json.load(f)
     return {}
 
-@st.cache_data
-def load_year_data(year):
-    """Loads and normalizes data for a specific year"""
-    files = [f for f in os.listdir('.') if f.startswith(f'PZ{year}') and f.endswith('.xlsx')]
+# Cache namespace of parsed applicant workbooks; bump when the reader's output changes
+APPLICANTS_CACHE = 'applicants_v2'
+
+def _numeric(values):
+    """Numbers (also numeric text such as '000583855'), NaN for empty or invalid cells"""
+    return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype='float64')
+
+def _admitted_flag(values):
+    """Prijat column: booleans (2024, also as 'True'/'False' text) or codes 1/2 (2025); empty -> 0"""
+    flags = {True: 1, False: 0, 'True': 1, 'False': 0}
+    return np.nan_to_num(_numeric([flags.get(v, v) if isinstance(v, (bool, str)) else v for v in values])).astype(int)
+
+def _text(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=object)
+
+_CONVERTERS = {'float': _numeric, 'flag': _admitted_flag, 'text': _text}
+
+def _typed_column(kind, values):
+    if kind == 'int':
+        # Whole-number columns without gaps (rok, kolo) stay integers, as pd.read_excel infers them
+        numbers = _numeric(values)
+        return numbers if np.isnan(numbers).any() else numbers.astype('int64')
+    return _CONVERTERS[kind](values)
+
+def read_applicant_workbook(path):
+    """
+    Parses one applicant workbook into the normalized wide format. Streams the first sheet in
+    openpyxl read-only mode: the header row is resolved through the schema registry
+    (src/schema.py), then only the used columns are taken from every row and converted column
+    by column into typed arrays.
+    """
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        schema = resolve_schema(header)
+        wanted = schema['columns']
+        width = len(header)
+        picked = []
+        for row in rows:
+            if len(row) < width: row = row + (None,) * (width - len(row))
+            if all(v is None for v in row): continue  # blank rows are skipped, like pd.read_excel
+            picked.append([row[i] for _, i in wanted])
+    finally:
+        wb.close()
+    columns = list(zip(*picked)) if picked else [()] * len(wanted)
+    return pd.DataFrame({name: _typed_column(schema['types'][name], values) for (name, _), values in zip(wanted, columns)})
+
+@st.cache_resource
+def load_round_data(year, round_num):
+    """Loads a single (year, round) partition of applicant data on demand.
+    Each workbook is parsed once and then served from the columnar cache (src/cache.py).
+    Cached as a shared resource: callers must treat the frame as read-only."""
+    files = [e['path'] for e in get_datasets(KIND_APPLICANTS, year, round_num)]
     if not files: return pd.DataFrame()
         
     dfs = []
     for f in files:
         try:
-            df = pd.read_excel(f)
-            # Normalize column names
-            df.columns = [normalize_column_name(c) for c in df.columns]
-            
-            # Deduplicate columns
-            unique_cols = []
-            seen = set()
-            for c in df.columns:
-                if c not in seen:
-                    unique_cols.append(c)
-                    seen.add(c)
-                else:
-                    unique_cols.append(f"{c}_dup_{len(seen)}")
-            df.columns = unique_cols
-
-            # Numeric conversion
-            num_cols = [c for c in df.columns if 'redizo' in c or c == 'kolo' or 'procentni_skor' in c]
-            for col in num_cols:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-            # Normalize 'Prijat' columns - in 2024 they might be bool, in 2025 numeric
-            prijat_cols = [c for c in df.columns if 'prijat' in c]
-            for col in prijat_cols:
-                if df[col].dtype == bool:
-                    df[col] = df[col].astype(int)
-                else:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
-            
-            dfs.append(df)
+            dfs.append(load_cached_frame(f, APPLICANTS_CACHE, read_applicant_workbook))
         except Exception as e:
             st.error(f"Chyba při načítání {f}: {e}")
             
     if not dfs: return pd.DataFrame()
-    return pd.concat(dfs, ignore_index=True)
+    return dfs[0] if len(dfs) == 1 else pd.concat(dfs, ignore_index=True)
+
+@st.cache_resource
+def load_rounds_data(year, rounds):
+    """
+    Combines the partitions of the selected rounds. Only the requested rounds are parsed.
+    A single round is returned as the partition itself (no copy); a multi-round
+    combination is concatenated once and shared across reruns.
+    """
+    parts = [load_round_data(year, r) for r in sorted(rounds)]
+    parts = [p for p in parts if not p.empty]
+    if not parts: return pd.DataFrame()
+    if len(parts) == 1: return parts[0]
+    return pd.concat(parts, ignore_index=True)
+
+def load_year_data(year):
+    """Loads all rounds of a specific year"""
+    return load_rounds_data(year, tuple(get_available_rounds(year)))
+
+# Region column of the capacity files
+REGION_COL = 'KRAJ - NÁZEV'
+
+def read_capacity_workbook(path):
+    """Parses one capacity workbook (REDIZO, KKOV, KAPACITA and region; identifiers as strings)"""
+    df = pd.read_excel(path)
+    # Based on inspection: ['REDIZO', 'KKOV', 'KAPACITA'] are key
+    # Using column indices or normalized names might be safer, but REDIZO/KKOV/KAPACITA seem stable
+    # 'KRAJ - NÁZEV' (region) is kept for the region filters
+    cols_to_use = [c for c in df.columns if c in ['REDIZO', 'KKOV', 'KAPACITA', REGION_COL]]
+    df = df[cols_to_use].copy()
+
+    # Try to find REDIZO or IZO
+    id_cols = [c for c in df.columns if c in ['REDIZO', 'IZO', 'RED_IZO']]
+    for col in id_cols:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int).astype(str)
+
+    if 'KKOV' in df.columns:
+        df['KKOV'] = df['KKOV'].astype(str).str.strip()
+    return df
 
 @st.cache_data
 def load_capacity_data(year, round_num=1):
-    """Loads official capacity data for a given year and round from Cermat XLSX"""
-    filename = f'PZ{year}_kolo{round_num}_skolobory_kapacity.xlsx'
-    if not os.path.exists(filename):
+    """Loads official capacity data for a given year and round from Cermat XLSX (columnar cache after the first parse)"""
+    filename = get_dataset_path(KIND_CAPACITIES, year, round_num)
+    if not filename:
         return pd.DataFrame()
     
     try:
-        df = pd.read_excel(filename)
-        # Based on inspection: ['REDIZO', 'KKOV', 'KAPACITA'] are key
-        # Using column indices or normalized names might be safer, but REDIZO/KKOV/KAPACITA seem stable
-        cols_to_use = [c for c in df.columns if c in ['REDIZO', 'KKOV', 'KAPACITA']]
-        df = df[cols_to_use].copy()
-        
-        # Try to find REDIZO or IZO
-        id_cols = [c for c in df.columns if c in ['REDIZO', 'IZO', 'RED_IZO']]
-        for col in id_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int).astype(str)
-            
-        if 'KKOV' in df.columns:
-            df['KKOV'] = df['KKOV'].astype(str).str.strip()
-            
-        return df
+        return load_cached_frame(filename, 'capacities', read_capacity_workbook)
     except Exception as e:
         print(f"Chyba při načítání kapacit {year} kolo {round_num}: {e}")
         return pd.DataFrame()
@@ -208,114 +178,151 @@ def get_sidebar_options(df_wide, _school_map):
     available_grades = sorted(list(set([get_grade_level(k) for k in available_kkovs])))
     return sorted(list(available_schools)), available_grades
 
+def filter_by_grade(df_wide, grade):
+    """Students (wide rows) with at least one application in the given grade"""
+    k_cols = [f'ss{j}_kkov' for j in range(1, 6) if f'ss{j}_kkov' in df_wide.columns]
+    mask = pd.Series(False, index=df_wide.index)
+    for c in k_cols:
+        mask = mask | (df_wide[c].map(get_grade_level) == grade)
+    return df_wide[mask]
+
+NOT_ADMITTED_LABEL = "Nepřijat / neznámá"
+
+def _categorical(codes, labels):
+    """Categorical from integer codes into a label list (duplicate labels are merged, -1 = missing)"""
+    label_codes, categories = pd.factorize(np.asarray(labels, dtype=object))
+    codes = np.asarray(codes)
+    return pd.Categorical.from_codes(np.where(codes >= 0, label_codes[codes], -1), categories=categories)
+
+def _school_codes(df_wide, col):
+    """RED_IZO column as integers (missing -> 0), the same normalization as the string keys of the school map"""
+    return pd.to_numeric(df_wide[col], errors='coerce').fillna(0).to_numpy(dtype='int64')
+
+def build_admission_map(df_wide, str_school_map, kkov_map):
+    """
+    Finds where every student was admitted: the first priority slot with ssN_prijat == 1
+    (argmax over the 5-column admission matrix). Works on integer school/field codes and
+    builds the "School" / "School (Field (KKOV))" labels only for the unique admissions.
+    Returns two categoricals indexed by row position (Student_UUID).
+    """
+    n = len(df_wide)
+    slots = [i for i in range(1, 6) if f'ss{i}_prijat' in df_wide.columns]
+    if not slots or n == 0:
+        nothing = _categorical(np.zeros(n, dtype=int), [NOT_ADMITTED_LABEL])
+        return nothing, nothing.copy()
+
+    admitted = np.column_stack([(df_wide[f'ss{i}_prijat'] == 1).to_numpy() for i in slots])
+    rows = np.flatnonzero(admitted.any(axis=1))
+    first = admitted[rows].argmax(axis=1)
+
+    riz_matrix = np.column_stack([_school_codes(df_wide, f'ss{i}_redizo') for i in slots])
+    kkov_matrix = np.column_stack([df_wide[f'ss{i}_kkov'].to_numpy(dtype=object) for i in slots])
+    school_codes, school_uniques = pd.factorize(riz_matrix[rows, first])
+    field_codes, field_uniques = pd.factorize(kkov_matrix[rows, first])  # missing KKOV -> -1
+
+    # Labels for unique schools / fields only
+    school_labels = [str_school_map.get(str(r), f"Neznámá škola ({r})") for r in school_uniques]
+    field_keys = [str(k) for k in field_uniques] + ["?"]
+    field_labels = [f"{kkov_map.get(k, k)} ({k})" for k in field_keys]
+
+    # Unique (school, field) pairs -> detail label
+    nf = len(field_keys)
+    pair_codes, pair_uniques = pd.factorize(school_codes.astype(np.int64) * nf + field_codes % nf)
+    detail_labels = [f"{school_labels[p // nf]} ({field_labels[p % nf]})" for p in pair_uniques]
+
+    school_by_student = np.full(n, len(school_labels))
+    detail_by_student = np.full(n, len(detail_labels))
+    school_by_student[rows] = school_codes
+    detail_by_student[rows] = pair_codes
+    return (_categorical(school_by_student, school_labels + [NOT_ADMITTED_LABEL]),
+            _categorical(detail_by_student, detail_labels + [NOT_ADMITTED_LABEL]))
+
 @st.cache_data
 def get_long_format(df_in, _school_map, _kkov_map, school_names_filter=None):
+    """
+    Converts the wide 5-slot layout into long format (1 row = 1 application).
+    All slots are stacked as integer codes; text columns (SchoolName, RED_IZO, KKOV, FieldName,
+    FieldLabel, Grade, Reason, AcceptedSchoolName, AcceptedDetail) are categoricals whose labels
+    are built once per unique school / KKOV / reason instead of once per row.
+    """
     if df_in.empty: return pd.DataFrame()
-    
-    # 1. Prepare wide data with unique Student ID
-    df_wide = df_in.copy()
-    df_wide['Student_UUID'] = range(len(df_wide))
-    
-    # Cast RED_IZO columns to normalized strings for mapping
+    slots = [i for i in range(1, 6) if f'ss{i}_redizo' in df_in.columns and f'ss{i}_kkov' in df_in.columns]
+    if not slots: return pd.DataFrame()
+
     str_school_map = {str(k): v for k, v in _school_map.items()}
-    riz_cols = [f'ss{j}_redizo' for j in range(1, 6) if f'ss{j}_redizo' in df_wide.columns]
-    for col in riz_cols:
-        df_wide[col] = pd.to_numeric(df_wide[col], errors='coerce').fillna(0).astype(int).astype(str)
 
-    # NEW: Pre-calculate Global Admission Map from WIDE data
-    # (This is much faster than doing it on the full long dataframe)
-    success_map_school = {}
-    success_map_detail = {}
-    
-    for i in range(1, 6):
-        r_col, k_col, p_col = f'ss{i}_redizo', f'ss{i}_kkov', f'ss{i}_prijat'
-        # Logic matches get_long_format's field labeling
-        if p_col in df_wide.columns:
-            admitted_mask = (df_wide[p_col] == 1)
-            # We only update if not already found in a higher priority (i < current)
-            # Actually range(1,6) already goes from highest to lowest priority.
-            sub_adm = df_wide[admitted_mask]
-            for idx, row in sub_adm.iterrows():
-                uuid = row['Student_UUID']
-                if uuid not in success_map_school:
-                    # Map REDIZO to Name
-                    riz = str(row[r_col])
-                    school_name = str_school_map.get(riz, f"Neznámá škola ({riz})")
-                    success_map_school[uuid] = school_name
-                    
-                    # Map FieldLabel
-                    kkov = str(row[k_col]) if pd.notna(row[k_col]) else "?"
-                    field_name = _kkov_map.get(kkov, kkov)
-                    field_label = f"{field_name} ({kkov})"
-                    success_map_detail[uuid] = f"{school_name} ({field_label})"
-
-    # OPTIONAL: Filter students early based on school names
+    # 1. Global Admission Map from WIDE data (one label per Student_UUID = row position)
+    accepted_school, accepted_detail = build_admission_map(df_in, str_school_map, _kkov_map)
+
+    # School table: unique RED_IZO codes across all slots -> names
+    riz_cols = [f'ss{j}_redizo' for j in range(1, 6) if f'ss{j}_redizo' in df_in.columns]
+    riz_codes_all, riz_uniques = pd.factorize(np.concatenate([_school_codes(df_in, c) for c in riz_cols]))
+    riz_labels = [str(r) for r in riz_uniques]
+    school_names = np.array([str_school_map.get(r, f"Neznámá škola ({r})") for r in riz_labels], dtype=object)
+    riz_codes = dict(zip(riz_cols, np.split(riz_codes_all, len(riz_cols))))
+
+    # OPTIONAL: Filter students early - keep those with a target school in ANY of their 5 priorities
+    students = np.arange(len(df_in))
     if school_names_filter:
-        # Keep students who have one of target schools in ANY of their 5 priorities
-        mask = pd.Series(False, index=df_wide.index)
+        wanted = np.isin(school_names, list(school_names_filter))
+        mask = np.zeros(len(df_in), dtype=bool)
         for col in riz_cols:
-            school_names = df_wide[col].map(str_school_map).fillna("Neznámá škola (" + df_wide[col] + ")")
-            mask = mask | school_names.isin(school_names_filter)
-        df_wide = df_wide[mask]
-        if df_wide.empty: return pd.DataFrame()
-
-    normalized_data = []
-    cjl_col = 'c_procentni_skor' if 'c_procentni_skor' in df_wide.columns else None
-    mat_col = 'm_procentni_skor' if 'm_procentni_skor' in df_wide.columns else None
-    
-    for i in range(1, 6):
-        r_col, k_col, p_col = f'ss{i}_redizo', f'ss{i}_kkov', f'ss{i}_prijat'
-        d_col = f'ss{i}_duvod_neprijeti'
-        
-        if r_col in df_wide.columns and k_col in df_wide.columns:
-            subset = df_wide[['Student_UUID', r_col, k_col, p_col, 'kolo']].copy()
-            subset.rename(columns={r_col: 'RED_IZO', k_col: 'KKOV', p_col: 'Prijat'}, inplace=True)
-            subset['Priority'] = i
-            
-            # School Name for current row
-            subset['SchoolName'] = subset['RED_IZO'].map(str_school_map).fillna("Neznámá škola (" + subset['RED_IZO'] + ")")
-
-            # Clean Reason
-            if d_col in df_wide.columns:
-                subset['Reason'] = df_wide[d_col].fillna("Neuvedeno").astype(str).str.strip()
-            else:
-                subset['Reason'] = "Neuvedeno"
-
-            # Point Calcs and Exemption identification
-            cjl_raw = df_wide[cjl_col] if cjl_col else pd.Series(None, index=subset.index)
-            mat_raw = df_wide[mat_col] if mat_col else pd.Series(None, index=subset.index)
-            
-            cjl_num = pd.to_numeric(cjl_raw, errors='coerce')
-            mat_num = pd.to_numeric(mat_raw, errors='coerce')
-            
-            subset['IsExempt'] = cjl_num.isna() & mat_num.notna()
-            subset['TotalPoints'] = ((cjl_num.fillna(0) * 0.5) + (mat_num.fillna(0) * 0.5)).clip(0, 100)
-            
-            # Map KKOV to Name
-            subset['Grade'] = subset['KKOV'].map(get_grade_level)
-            kkov_val = subset['KKOV'].astype(str).fillna("?")
-            subset['FieldName'] = subset['KKOV'].astype(str).map(_kkov_map).fillna(kkov_val)
-            subset['FieldLabel'] = subset['FieldName'].astype(str) + " (" + kkov_val + ")"
-            
-            # Detect "vzdal se přijetí"
-            subset['GaveUpSpot'] = subset['Reason'].str.contains('vzdal', case=False, na=False)
-            
-            # Pre-calculate boolean flags for high-performance KPI calculations (avoid regex in loop)
-            subset['is_capacity_reject'] = subset['Reason'].str.contains('kapacit', case=False, na=False)
-            subset['is_lost_priority'] = subset['Reason'].str.contains('vyssi_priorit|vyssi prioritu', case=False, na=False)
-            subset['is_failure'] = subset['Reason'].str.contains('nespln|neprosp|nesplnil|nedosah|kriteri', case=False, na=False)
-            
-            normalized_data.append(subset)
-    
-    if not normalized_data: return pd.DataFrame()
-    res = pd.concat(normalized_data, ignore_index=True)
-    
-    # 2. POST-PROCESSING: Apply pre-calculated mapping
-    res['AcceptedSchoolName'] = res['Student_UUID'].map(success_map_school).fillna("Nepřijat / neznámá")
-    res['AcceptedDetail'] = res['Student_UUID'].map(success_map_detail).fillna("Nepřijat / neznámá")
+            mask |= wanted[riz_codes[col]]
+        students = np.flatnonzero(mask)
+        if len(students) == 0: return pd.DataFrame()
+
+    m = len(students)
+    def stack(cols, default=None):
+        return np.concatenate([df_in[c].to_numpy(dtype=object)[students] if c in df_in.columns else np.full(m, default, dtype=object) for c in cols])
+
+    slot_riz = np.concatenate([riz_codes[f'ss{i}_redizo'][students] for i in slots])
+    kkov_codes, kkov_uniques = pd.factorize(stack([f'ss{i}_kkov' for i in slots]))
+    reason_codes, reason_uniques = pd.factorize(stack([f'ss{i}_duvod_neprijeti' for i in slots]))
+    prijat = np.concatenate([df_in[f'ss{i}_prijat'].to_numpy()[students] if f'ss{i}_prijat' in df_in.columns else np.zeros(m, dtype=int) for i in slots])
+
+    # Point Calcs and Exemption identification (per student, repeated for every slot)
+    cjl_num = pd.to_numeric(df_in['c_procentni_skor'], errors='coerce').to_numpy()[students] if 'c_procentni_skor' in df_in.columns else np.full(m, np.nan)
+    mat_num = pd.to_numeric(df_in['m_procentni_skor'], errors='coerce').to_numpy()[students] if 'm_procentni_skor' in df_in.columns else np.full(m, np.nan)
+    is_exempt = np.isnan(cjl_num) & ~np.isnan(mat_num)
+    total_points = np.clip(np.nan_to_num(cjl_num) * 0.5 + np.nan_to_num(mat_num) * 0.5, 0, 100)
+
+    # KKOV table: names, labels and grade per unique code (empty slots render as "nan")
+    kkov_keys = [str(k) for k in list(kkov_uniques) + [np.nan]]
+    field_names = [str(_kkov_map.get(k, k)) for k in kkov_keys]
+    field_labels = [f"{name} ({k})" for name, k in zip(field_names, kkov_keys)]
+    grades = [get_grade_level(k) for k in kkov_keys]
+    kkov_rows = np.where(kkov_codes >= 0, kkov_codes, len(kkov_uniques))
+
+    # Reason table: cleaned label per unique raw reason (missing -> "Neuvedeno")
+    reason_labels = [str(r).strip() for r in reason_uniques] + ["Neuvedeno"]
+    reason_rows = np.where(reason_codes >= 0, reason_codes, len(reason_uniques))
+
+    uuids = np.tile(students, len(slots))
+    res = pd.DataFrame({
+        'Student_UUID': uuids,
+        'RED_IZO': pd.Categorical.from_codes(slot_riz, categories=riz_labels),
+        'KKOV': pd.Categorical.from_codes(kkov_codes, categories=kkov_uniques),
+        'Prijat': prijat,
+        'kolo': np.tile(df_in['kolo'].to_numpy()[students], len(slots)),
+        'Priority': np.repeat(slots, m),
+        'SchoolName': _categorical(slot_riz, school_names),
+        'Reason': _categorical(reason_rows, reason_labels),
+        'IsExempt': np.tile(is_exempt, len(slots)),
+        'TotalPoints': np.tile(total_points, len(slots)),
+        'Grade': _categorical(kkov_rows, grades),
+        'FieldName': _categorical(kkov_rows, field_names),
+        'FieldLabel': _categorical(kkov_rows, field_labels),
+    })
+
+    # Reason enum (src/utils REASON_*): classified once per unique reason, consumers compare integers
+    res['ReasonCode'] = classify_reasons(res['Reason'], admitted=(prijat == 1))
+
+    # 2. POST-PROCESSING: Apply pre-calculated admission map
+    res['AcceptedSchoolName'] = accepted_school[uuids]
+    res['AcceptedDetail'] = accepted_detail[uuids]
 
     # 3. FINAL FILTER: If filtering by schools, ensure we ONLY return those schools
-    # (previous df_wide filter only reduced the student count, but students have multiple applications)
+    # (previous student filter only reduced the student count, but students have multiple applications)
     if school_names_filter:
         res = res[res['SchoolName'].isin(school_names_filter)]
     
@@ -0,0 +1,121 @@
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .cache import get_cache_path, read_frame, write_frame
+from .data_loader import load_rounds_data, load_school_map, load_kkov_map, get_long_format, filter_by_grade, NOT_ADMITTED_LABEL
+from .kpi_cube import CUBE_NAMESPACE, ALL_GRADES, get_cube_fingerprint, get_round_combinations
+from .utils import rounds_key, REASON_HIGHER_PRIORITY, REASON_CAPACITY, REASON_FAILED
+
+# Redistribution categories (rejection reason of the source application)
+FLOW_CATEGORIES = (REASON_HIGHER_PRIORITY, REASON_CAPACITY, REASON_FAILED)
+
+def flow_triplets(long_df):
+    """
+    Counts of rejected applications by (category, source school/field, destination AcceptedDetail),
+    only for applicants admitted elsewhere. One row per non-zero cell.
+    """
+    codes = long_df['ReasonCode'].to_numpy()
+    mask = (long_df['Prijat'] != 1).to_numpy() & np.isin(codes, FLOW_CATEGORIES) & \
+        (long_df['AcceptedDetail'] != NOT_ADMITTED_LABEL).to_numpy()
+    sub = long_df[mask]
+    cells = pd.DataFrame({
+        'category': codes[mask],
+        'source_school': sub['SchoolName'].astype(str).to_numpy(),
+        'source_field': sub['FieldLabel'].astype(str).to_numpy(),
+        'dest': sub['AcceptedDetail'].astype(str).to_numpy(),
+    })
+    return cells.value_counts(sort=False).rename('count').reset_index()
+
+def _csr(rows, cols, data, n_rows):
+    """CSR arrays (indptr, indices, data) from COO cells, rows sorted"""
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n_rows + 1, dtype='int64')
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, cols[order], data[order]
+
+def build_flow_matrix(triplets):
+    """
+    Sparse flow matrix per category: forward CSR (source group -> destination) for
+    "where did they go" and reverse CSR (destination -> source group) for "where do they come from".
+    """
+    src_codes, sources = pd.MultiIndex.from_frame(triplets[['source_school', 'source_field']]).factorize()
+    dst_codes, dests = pd.factorize(triplets['dest'])
+    counts = triplets['count'].to_numpy(dtype='int64')
+    categories = triplets['category'].to_numpy()
+    flows = {'sources': sources, 'dests': np.asarray(dests, dtype=object), 'forward': {}, 'reverse': {},
+             'source_labels': np.array([f"{s} ({f})" for s, f in sources], dtype=object)}
+    for cat in FLOW_CATEGORIES:
+        m = categories == cat
+        flows['forward'][cat] = _csr(src_codes[m], dst_codes[m], counts[m], len(sources))
+        flows['reverse'][cat] = _csr(dst_codes[m], src_codes[m], counts[m], len(dests))
+    return flows
+
+def _row_sums(csr, rows, n_cols):
+    """Column totals over the given CSR rows (touches only their non-zeros)"""
+    indptr, indices, data = csr
+    if len(rows) == 0: return np.zeros(n_cols, dtype='int64')
+    parts = [np.arange(indptr[r], indptr[r + 1]) for r in rows]
+    pos = np.concatenate(parts)
+    return np.bincount(indices[pos], weights=data[pos], minlength=n_cols).astype('int64')
+
+def _top(labels, totals, n):
+    """Top-n labels by count (ties by label), zero counts dropped"""
+    nz = np.flatnonzero(totals)
+    nz = nz[np.lexsort((labels[nz].astype(str), -totals[nz]))][:n]
+    return pd.DataFrame({'label': labels[nz], 'count': totals[nz]})
+
+def top_destinations(flows, source_keys, category, n=15):
+    """Where did the rejected applicants of the given (school, field) groups get admitted (top n)"""
+    ids = flows['sources'].get_indexer(pd.MultiIndex.from_tuples([(str(s), str(f)) for s, f in source_keys]))
+    totals = _row_sums(flows['forward'][category], ids[ids >= 0], len(flows['dests']))
+    return _top(flows['dests'], totals, n)
+
+def top_sources(flows, dest_labels, category, n=15):
+    """Reverse query: where were the students admitted to the given AcceptedDetail labels rejected (top n)"""
+    ids = pd.Index(flows['dests']).get_indexer(list(dest_labels))
+    ids = ids[ids >= 0]
+    totals = _row_sums(flows['reverse'][category], ids, len(flows['sources']))
+    return _top(flows['source_labels'], totals, n)
+
+@st.cache_resource
+def compute_flow_matrix(year, rounds, grade=None):
+    """Flow matrix of a round selection and grade filter, built from the full long format (cached)"""
+    wide_df = load_rounds_data(year, tuple(rounds))
+    if grade and grade != ALL_GRADES:
+        wide_df = filter_by_grade(wide_df, grade)
+    long_df = get_long_format(wide_df, load_school_map(), load_kkov_map())
+    if long_df.empty: return None
+    return build_flow_matrix(flow_triplets(long_df))
+
+def get_flows_path(year):
+    return get_cache_path(CUBE_NAMESPACE, f"PZ{year}_flows", get_cube_fingerprint(year))
+
+def write_flows(year):
+    """Precomputes the flow triplets of every round combination (all grades); returns the file path"""
+    tables = []
+    for rounds in get_round_combinations(year):
+        long_df = get_long_format(load_rounds_data(year, rounds), load_school_map(), load_kkov_map())
+        if not long_df.empty:
+            tables.append(flow_triplets(long_df).assign(rounds=rounds_key(rounds)))
+    path = get_flows_path(year)
+    write_frame(pd.concat(tables, ignore_index=True), path)
+    return path
+
+@st.cache_resource
+def read_flows(path):
+    """{rounds key: flow matrix} from a precomputed flows file"""
+    table = read_frame(path)
+    return {key: build_flow_matrix(part.reset_index(drop=True)) for key, part in table.groupby('rounds', sort=False)}
+
+def load_flows(year):
+    """{rounds key: flow matrix} if precomputed for the current data, else None (misses are not cached)"""
+    path = get_flows_path(year)
+    return read_flows(path) if os.path.exists(path) else None
+
+def get_flow_matrix(year, rounds, grade=None):
+    """Precomputed flow matrix of the round selection, or computed once and cached (grade filters)"""
+    if not grade or grade == ALL_GRADES:
+        flows = (load_flows(year) or {}).get(rounds_key(rounds))
+        if flows is not None: return flows
+    return compute_flow_matrix(year, tuple(sorted(rounds)), grade)
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+# TotalPoints = (ČJ % + MA %) / 2 of integer percentages, so 0.5-point bins hold exact values
+BIN_WIDTH = 0.5
+MAX_POINTS = 100
+N_BINS = int(MAX_POINTS / BIN_WIDTH) + 1
+BIN_VALUES = np.arange(N_BINS) * BIN_WIDTH
+
+# Outcome axis = ReasonCode (REASON_ADMITTED ... REASON_UNKNOWN), exempt axis = IsExempt (0 regular, 1 exempt)
+N_OUTCOMES = 6
+
+def bin_index(points):
+    """Bin of every score (nearest 0.5 point, clipped to 0-100)"""
+    return np.clip(np.rint(np.asarray(points, dtype='float64') / BIN_WIDTH), 0, N_BINS - 1).astype('int64')
+
+def histogram_from_points(points):
+    """Fixed-bin histogram of a score array"""
+    return np.bincount(bin_index(points), minlength=N_BINS)
+
+def build_histograms(long_df, by=('SchoolName', 'FieldLabel')):
+    """
+    Histograms of every (group, outcome, exempt flag) over the fixed bins in one bincount.
+    Returns {'index': group index, 'counts': integer array [group, outcome, exempt, bin]}.
+    """
+    by = list(by)
+    grouped = long_df.groupby(by, observed=True, sort=True)
+    gid = grouped.ngroup().to_numpy()
+    n = grouped.ngroups
+    codes = np.clip(long_df['ReasonCode'].to_numpy(dtype='int64'), 0, N_OUTCOMES - 1)
+    exempt = long_df['IsExempt'].to_numpy(dtype='int64')
+    flat = ((gid * N_OUTCOMES + codes) * 2 + exempt) * N_BINS + bin_index(long_df['TotalPoints'].to_numpy())
+    counts = np.bincount(flat, minlength=n * N_OUTCOMES * 2 * N_BINS)
+    counts = counts.astype('uint16' if counts.max(initial=0) <= np.iinfo('uint16').max else 'uint32')
+    return {'index': grouped.size().index, 'counts': counts.reshape(n, N_OUTCOMES, 2, N_BINS)}
+
+def group_histogram(hists, keys, outcomes=None, exempt=None):
+    """Histogram summed over the given groups, outcomes (ReasonCodes, None = all) and exempt flag (None = both)"""
+    ids = hists['index'].get_indexer(pd.Index(list(keys), tupleize_cols=True))
+    counts = hists['counts'][ids[ids >= 0]].astype('int64')
+    if outcomes is not None: counts = counts[:, list(outcomes)]
+    if exempt is not None: counts = counts[:, :, [int(exempt)]]
+    return counts.sum(axis=(0, 1, 2)) if counts.size else np.zeros(N_BINS, dtype='int64')
+
+def hist_min(h):
+    """Lowest score present, None for an empty histogram"""
+    nz = np.flatnonzero(h)
+    return float(BIN_VALUES[nz[0]]) if len(nz) else None
+
+def hist_mean(h):
+    n = h.sum()
+    return float(h @ BIN_VALUES / n) if n else None
+
+def hist_percentile(h, q):
+    """Nearest-rank percentile: smallest score with at least q % of the values at or below it"""
+    n = h.sum()
+    if not n: return None
+    cum = np.cumsum(h)
+    return float(BIN_VALUES[np.searchsorted(cum, max(1, np.ceil(q / 100 * n)))])
+
+def _first_k_mean(h, values, k):
+    """Mean of the first k values of a histogram in the given bin order (all of them if fewer)"""
+    n = h.sum()
+    if not n: return None
+    k = min(int(k), n)
+    taken = np.minimum(h, np.maximum(k - (np.cumsum(h) - h), 0))
+    return float(taken @ values / k)
+
+def hist_top_mean(h, k):
+    """Mean of the k highest scores"""
+    return _first_k_mean(h[::-1], BIN_VALUES[::-1], k)
+
+def hist_bottom_mean(h, k):
+    """Mean of the k lowest scores"""
+    return _first_k_mean(h, BIN_VALUES, k)
+
+def hist_range_count(h, low, high):
+    """Number of scores within [low, high]"""
+    return int(h[(BIN_VALUES >= low) & (BIN_VALUES <= high)].sum())
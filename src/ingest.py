@@ -0,0 +1,256 @@
+import os
+import json
+import time
+from datetime import datetime
+import streamlit as st
+from .cache import CACHE_DIR, file_sha1
+from .catalog import get_catalog, get_available_years, KIND_APPLICANTS
+from .school_register import REGISTER_FILE
+from .data_loader import (load_round_data, load_rounds_data, load_capacity_data,
+                          load_school_map, load_izo_to_redizo_map, load_kkov_map)
+from .parallel import parse_workbooks, prefetch_year
+from .capacity import load_capacity_index
+from .kpi_cube import write_kpi_cube, read_kpi_cube, get_round_combinations
+from .ranking import write_rankings, read_rankings, compute_rankings
+from .flows import write_flows, read_flows, compute_flow_matrix
+from .competition import write_co_application, load_co_application
+from .trends import write_year_partition, load_year_partition
+from .simulation import load_market, simulate_baseline
+from .score_index import get_score_index
+from .similarity import get_similarity_index
+from .strategy import get_admission_model
+
+MANIFEST_PATH = os.path.join(CACHE_DIR, 'manifest.json')
+KIND_REGISTER = 'register'
+REGISTER_SOURCES = (REGISTER_FILE, 'kkov_map.json')
+
+# Builds kept in the manifest: a running app catches up on all builds newer than the one it serves
+MAX_BUILDS = 20
+
+# Artifacts derived from all sources of a year (stored in .cache/kpi_cube/, see build_kpi_cube.py)
+YEAR_ARTIFACTS = {
+    'cube': write_kpi_cube,
+    'rankings': write_rankings,
+    'flows': write_flows,
+    'co_application': write_co_application,
+    'trend': write_year_partition,
+}
+
+# Version of the data this process serves (see swap_to_latest)
+_active = {'version': None}
+
+def load_manifest(path=MANIFEST_PATH):
+    """Build manifest ({'version', 'files', 'builds'}), empty version 0 if none was recorded yet"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'version': 0, 'files': {}, 'builds': []}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Writes the manifest atomically (a running app never reads a half-written file)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def scan_sources(known=None, root='.'):
+    """
+    {file name: {'path', 'kind', 'year', 'round', 'size', 'mtime_ns', 'sha1'}} of all Cermat exports
+    and register files. Content is hashed only when size or mtime differ from the known entry.
+    """
+    entries = [dict(e) for e in get_catalog(root)]
+    for name in REGISTER_SOURCES:
+        path = os.path.join(root, name)
+        if os.path.exists(path):
+            entries.append({'path': path, 'kind': KIND_REGISTER, 'year': None, 'round': None})
+    known = known or {}
+    sources = {}
+    for e in entries:
+        stat = os.stat(e['path'])
+        name = os.path.basename(e['path'])
+        prev = known.get(name, {})
+        e.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        same_stat = prev.get('size') == e['size'] and prev.get('mtime_ns') == e['mtime_ns']
+        e['sha1'] = prev['sha1'] if same_stat and prev.get('sha1') else file_sha1(e['path'])
+        sources[name] = e
+    return sources
+
+def diff_sources(old, new):
+    """(new or changed file names, removed file names) by content hash"""
+    changed = sorted(n for n, e in new.items() if old.get(n, {}).get('sha1') != e['sha1'])
+    removed = sorted(n for n in old if n not in new)
+    return changed, removed
+
+def affected_partitions(entries):
+    """
+    (applicant (year, round) partitions, capacity (year, round) partitions, years) depending on the
+    given source entries; a register change affects every year.
+    """
+    applicants, capacities, years = set(), set(), set()
+    for e in entries:
+        if e['kind'] == KIND_REGISTER:
+            years.update(get_available_years())
+            continue
+        part = (e['year'], int(e['round']))
+        (applicants if e['kind'] == KIND_APPLICANTS else capacities).add(part)
+        years.add(e['year'])
+    return sorted(applicants), sorted(capacities), sorted(years)
+
+def refresh_stats(manifest, sources):
+    """
+    Stores the current size/mtime of files whose content is unchanged (touched, copied or checked
+    out again), so later scans skip hashing them; changed files keep their old entry until ingested.
+    """
+    known = manifest.get('files', {})
+    files = {n: sources[n] if n in sources and sources[n]['sha1'] == e.get('sha1') else e for n, e in known.items()}
+    if files != known:
+        save_manifest({**manifest, 'files': files})
+
+def pending_changes(root='.'):
+    """(changed, removed) source files not yet processed by ingest(); cheap when nothing changed"""
+    manifest = load_manifest()
+    known = manifest.get('files', {})
+    sources = scan_sources(known, root)
+    refresh_stats(manifest, sources)
+    return diff_sources(known, sources)
+
+def clear_caches(applicants=(), capacities=(), years=(), register=False):
+    """
+    Drops the in-memory cache entries (st.cache_data / st.cache_resource) that depend on the given
+    partitions and years; everything else stays warm. Entries are recreated on the next access.
+    """
+    if register:
+        for func in (load_school_map, load_izo_to_redizo_map, load_kkov_map):
+            func.clear()
+    for year, round_num in applicants:
+        load_round_data.clear(year, round_num)
+    for year, round_num in capacities:
+        load_capacity_data.clear(year, round_num)
+    for year in years:
+        for func in (prefetch_year, load_capacity_index, load_co_application, load_year_partition):
+            func.clear(year)
+        # Round selections of the year (the app always passes the selected rounds in ascending order)
+        for rounds in get_round_combinations(year):
+            for func in (load_rounds_data, compute_rankings, load_market, simulate_baseline,
+                         get_score_index, get_similarity_index, get_admission_model):
+                func.clear(year, rounds)
+    if years:
+        compute_flow_matrix.clear()  # keyed by grade filter as well
+        # Precomputed artifacts are keyed by source fingerprint: drop the superseded ones
+        for func in (read_kpi_cube, read_rankings, read_flows):
+            func.clear()
+
+def build_year_artifacts(year):
+    """Writes every derived artifact of a year; returns {artifact: (paths, seconds)}"""
+    built = {}
+    for name, writer in YEAR_ARTIFACTS.items():
+        t = time.perf_counter()
+        paths = writer(year)
+        built[name] = (paths if isinstance(paths, list) else [paths], round(time.perf_counter() - t, 2))
+    return built
+
+def ingest(root='.', force=False):
+    """
+    Incremental ingestion: hashes the source files, parses only new or changed exports into the
+    columnar cache (in parallel), rebuilds the derived artifacts of the affected years and records a
+    new manifest version. Returns the build record, or None if nothing changed.
+    """
+    manifest = load_manifest()
+    sources = scan_sources(manifest.get('files', {}), root)
+    changed, removed = diff_sources(manifest.get('files', {}), sources)
+    if force: changed = sorted(sources)
+    if not changed and not removed:
+        refresh_stats(manifest, sources)  # touched but identical files
+        return None
+
+    t0 = time.perf_counter()
+    touched = [sources[n] for n in changed] + [manifest['files'][n] for n in removed]
+    applicants, capacities, years = affected_partitions(touched)
+    register = any(e['kind'] == KIND_REGISTER for e in touched)
+    # Stale frames must go before anything is rebuilt from them
+    clear_caches(applicants, capacities, years, register)
+    years = [y for y in years if y in get_available_years()]  # a year whose files were all removed has nothing to build
+
+    # New workbooks are parsed into the columnar cache in parallel (src/parallel.py)
+    parsed = parse_workbooks([sources[n] for n in changed if sources[n]['kind'] != KIND_REGISTER])
+    timings = {p['file']: p['seconds'] for p in parsed}
+    artifacts = {}
+    for year in years:
+        artifacts[year] = {name: seconds for name, (_, seconds) in build_year_artifacts(year).items()}
+
+    return record_build(manifest, sources, {
+        'changed': changed,
+        'removed': removed,
+        'applicants': [list(p) for p in applicants],
+        'capacities': [list(p) for p in capacities],
+        'years': years,
+        'register': register,
+        'parse_seconds': timings,
+        'artifact_seconds': artifacts,
+        'seconds': round(time.perf_counter() - t0, 2),
+    })
+
+def record_build(manifest, sources, build):
+    """Records a build as the next manifest version (picked up by swap_to_latest in a running app)"""
+    build = {'version': manifest.get('version', 0) + 1, 'built_at': datetime.now().isoformat(timespec='seconds'), **build}
+    save_manifest({
+        'version': build['version'],
+        'files': sources,
+        'builds': (manifest.get('builds', []) + [build])[-MAX_BUILDS:],
+    })
+    _active['version'] = build['version']
+    return build
+
+def rebuild_years(years, root='.'):
+    """
+    Rebuilds every derived artifact of the given years (build_kpi_cube.py) and records the build,
+    so a running app drops its cached artifacts of those years. Source changes not yet ingested
+    stay pending. Returns {year: {artifact: (paths, seconds)}}.
+    """
+    t0 = time.perf_counter()
+    manifest = load_manifest()
+    built = {year: build_year_artifacts(year) for year in years}
+    record_build(manifest, manifest.get('files') or scan_sources(root=root), {
+        'changed': [], 'removed': [], 'applicants': [], 'capacities': [],
+        'years': list(years),
+        'register': False,
+        'parse_seconds': {},
+        'artifact_seconds': {year: {name: seconds for name, (_, seconds) in artifacts.items()} for year, artifacts in built.items()},
+        'seconds': round(time.perf_counter() - t0, 2),
+    })
+    return built
+
+def adopt_sources(root='.'):
+    """
+    First start without a manifest: records the current sources as version 1 without rebuilding
+    (artifacts are keyed by source fingerprints, so missing ones are built lazily on first use).
+    """
+    manifest = {'version': 1, 'files': scan_sources(root=root), 'builds': []}
+    save_manifest(manifest)
+    return manifest
+
+def swap_to_latest(root='.'):
+    """
+    Hot swap: if the manifest records builds newer than the data this process serves (e.g. from
+    ingest_data.py run next to the app), drops the affected cache entries so the next access loads
+    the new version. Returns the list of builds applied. The first call only records the version.
+    """
+    manifest = load_manifest()
+    if not manifest.get('files'): manifest = adopt_sources(root)
+    version = manifest.get('version', 0)
+    if _active['version'] is None:
+        _active['version'] = version
+        return []
+    if version <= _active['version']: return []
+    builds = [b for b in manifest.get('builds', []) if b['version'] > _active['version']]
+    if len(builds) < version - _active['version']:
+        # Older builds fell out of the manifest: start from empty caches
+        st.cache_data.clear()
+        st.cache_resource.clear()
+    else:
+        for b in builds:
+            clear_caches([tuple(p) for p in b['applicants']], [tuple(p) for p in b['capacities']], b['years'], b['register'])
+    _active['version'] = version
+    return builds
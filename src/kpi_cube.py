@@ -0,0 +1,107 @@
+import os
+import hashlib
+from itertools import combinations
+import pandas as pd
+import streamlit as st
+from .cache import file_fingerprint, get_cache_path, read_frame, write_frame
+from .catalog import get_datasets, get_available_rounds, KIND_APPLICANTS, KIND_CAPACITIES
+from .data_loader import load_rounds_data, load_school_map, load_kkov_map, get_long_format, get_sidebar_options, filter_by_grade
+from .capacity import lookup_capacities
+from .analysis import kpis_from_stats
+from .round_stats import summarize_rounds, merge_rounds, get_group_ids
+from .school_register import REGISTER_FILE
+
+CUBE_NAMESPACE = 'kpi_cube'
+ALL_GRADES = "Všechny"
+GROUP_COLS = ['SchoolName', 'FieldLabel']
+
+def get_cube_sources(year):
+    """All files the KPI cube of a year is derived from"""
+    files = [e['path'] for e in get_datasets(KIND_APPLICANTS, year) + get_datasets(KIND_CAPACITIES, year)]
+    return sorted(files) + [f for f in (REGISTER_FILE, 'kkov_map.json') if os.path.exists(f)]
+
+def get_cube_fingerprint(year):
+    """Combined fingerprint of all sources (same size-mtime-hash shape as file_fingerprint)"""
+    sources = get_cube_sources(year)
+    prints = [file_fingerprint(f) for f in sources]
+    digest = hashlib.sha1('|'.join(prints).encode()).hexdigest()[:16]
+    return f"{len(prints)}-{max((os.stat(f).st_mtime_ns for f in sources), default=0)}-{digest}"
+
+# Summary tables stored per year (see round_stats.summarize_rounds)
+CUBE_PARTS = ('groups', 'stats', 'tails', 'points')
+
+def get_cube_path(year, part, fingerprint=None):
+    return get_cache_path(CUBE_NAMESPACE, f"PZ{year}_{part}", fingerprint or get_cube_fingerprint(year))
+
+def get_round_combinations(year):
+    """Every non-empty combination of the available rounds"""
+    rounds = get_available_rounds(year)
+    return [c for n in range(1, len(rounds) + 1) for c in combinations(rounds, n)]
+
+def build_kpi_cube(year):
+    """
+    Mergeable per-round KPI summaries of every school/field for each grade filter of a year.
+    Mirrors the app pipeline: rounds -> grade filter (wide) -> long format; any round
+    combination is later produced by merging the per-round summaries (round_stats.merge_rounds).
+    Returns {part: DataFrame} with a 'grade' column in every part.
+    """
+    school_map, kkov_map = load_school_map(), load_kkov_map()
+    wide_df = load_rounds_data(year, tuple(get_available_rounds(year)))
+    if wide_df.empty: return {}
+    _, grades = get_sidebar_options(wide_df, school_map)
+    parts = {part: [] for part in CUBE_PARTS}
+    for grade in [ALL_GRADES] + grades:
+        grade_df = wide_df if grade == ALL_GRADES else filter_by_grade(wide_df, grade)
+        summary = summarize_rounds(get_long_format(grade_df, school_map, kkov_map))
+        if summary is None: continue
+        for part in CUBE_PARTS:
+            parts[part].append(summary[part].assign(grade=grade))
+    return {part: pd.concat(frames, ignore_index=True) for part, frames in parts.items() if frames}
+
+def write_kpi_cube(year):
+    """Builds the cube of a year and stores its parts in the cache directory; returns their paths"""
+    paths = []
+    fingerprint = get_cube_fingerprint(year)
+    for part, frame in build_kpi_cube(year).items():
+        paths.append(get_cube_path(year, part, fingerprint))
+        write_frame(frame, paths[-1])
+    return paths
+
+@st.cache_resource
+def read_kpi_cube(year, fingerprint):
+    """{grade: round summary} from the cube files built for the given source fingerprint"""
+    cube = {}
+    for part in CUBE_PARTS:
+        for grade, table in read_frame(get_cube_path(year, part, fingerprint)).groupby('grade', sort=False):
+            cube.setdefault(grade, {})[part] = table.drop(columns='grade').reset_index(drop=True)
+    return cube
+
+def load_kpi_cube(year):
+    """
+    {grade: round summary} of a year if the cube has been built for the current source files,
+    otherwise None. Misses are not cached, so a cube built later is picked up on the next call;
+    the files are read once per source fingerprint, so a stale cube (data replaced after the
+    build) is never served.
+    """
+    fingerprint = get_cube_fingerprint(year)
+    if not all(os.path.exists(get_cube_path(year, part, fingerprint)) for part in CUBE_PARTS): return None
+    return read_kpi_cube(year, fingerprint)
+
+def lookup_cube_kpis(cube, selected_rounds, grade, long_df, capacity_index):
+    """
+    KPI table for the groups of long_df, merged from the cube's per-round summaries (same rows
+    and order as calculate_kpis_grouped(long_df, ...)). Capacities follow the round 1 baseline
+    rule of the selected rounds. Returns None when the cube cannot answer (no cube, unknown
+    grade or a group missing), so the caller computes live.
+    """
+    if cube is None or long_df.empty: return None
+    summary = cube.get(grade or ALL_GRADES)
+    if summary is None: return None
+    keys = long_df.groupby(GROUP_COLS, observed=True).size().index
+    ids = get_group_ids(summary, keys)
+    if (ids < 0).any(): return None
+    stats = merge_rounds(summary, selected_rounds, ids)
+    if len(stats) != len(keys): return None
+    stats = stats.reindex(pd.MultiIndex.from_arrays([keys.get_level_values(c).astype(str) for c in GROUP_COLS]))
+    caps = lookup_capacities(capacity_index, zip(stats['RED_IZO'], stats['KKOV']), selected_rounds)
+    return kpis_from_stats(stats, dict(zip(stats.index, caps)))
@@ -0,0 +1,53 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import streamlit as st
+from .cache import file_fingerprint, get_cache_path, write_frame
+from .catalog import get_datasets, KIND_APPLICANTS, KIND_CAPACITIES
+from .data_loader import read_applicant_workbook, read_capacity_workbook, APPLICANTS_CACHE
+
+# Cache namespace and parser of every dataset kind (same as load_round_data / load_capacity_data)
+PARSERS = {
+    KIND_APPLICANTS: (APPLICANTS_CACHE, read_applicant_workbook),
+    KIND_CAPACITIES: ('capacities', read_capacity_workbook),
+}
+
+def _cache_path(path, kind):
+    return get_cache_path(PARSERS[kind][0], path, file_fingerprint(path))
+
+def parse_to_cache(path, kind):
+    """
+    Worker: parses one workbook straight into its Arrow cache entry. Only the timing goes back to
+    the parent, which then memory-maps the file (no DataFrame is pickled between processes).
+    """
+    t = time.perf_counter()
+    write_frame(PARSERS[kind][1](path), _cache_path(path, kind))
+    return {'file': os.path.basename(path), 'kind': kind, 'seconds': round(time.perf_counter() - t, 2), 'pid': os.getpid()}
+
+def parse_workbooks(entries, max_workers=None):
+    """
+    Parses the catalog entries whose columnar cache is missing, in parallel (one process per
+    workbook, up to the number of cores). Returns per-file timings; files already cached are skipped.
+    A single workbook is parsed in-process, and so is everything when processes cannot be started.
+    """
+    todo = [e for e in entries if not os.path.exists(_cache_path(e['path'], e['kind']))]
+    todo.sort(key=lambda e: os.path.getsize(e['path']), reverse=True)  # largest first balances the workers
+    workers = min(len(todo), max_workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [parse_to_cache(e['path'], e['kind']) for e in todo]
+    try:
+        # spawn: safe next to the Streamlit server threads and the only option on Windows
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(parse_to_cache, e['path'], e['kind']) for e in todo]
+            return [f.result() for f in futures]
+    except (OSError, BrokenProcessPool) as err:
+        print(f"Paralelní načítání selhalo ({err}), pokračuji sekvenčně")
+        return [parse_to_cache(e['path'], e['kind']) for e in todo
+                if not os.path.exists(_cache_path(e['path'], e['kind']))]
+
+@st.cache_resource
+def prefetch_year(year):
+    """Parses all applicant and capacity workbooks of a year at once before the first load (per-file timings)"""
+    return parse_workbooks(get_datasets(KIND_APPLICANTS, year) + get_datasets(KIND_CAPACITIES, year))
@@ -0,0 +1,67 @@
+import os
+import pandas as pd
+import streamlit as st
+from .cache import get_cache_path, read_frame, write_frame
+from .data_loader import load_rounds_data, load_school_map, load_kkov_map, get_long_format
+from .capacity import load_capacity_index, get_group_capacities
+from .analysis import calculate_kpis_grouped
+from .kpi_cube import CUBE_NAMESPACE, GROUP_COLS, get_cube_fingerprint, get_round_combinations
+from .ui_components import COMPARABLE_METRICS
+from .utils import rounds_key
+
+RANKED_KPIS = list(COMPARABLE_METRICS.values())
+
+def rank_within_peers(kpi_table, metrics=RANKED_KPIS, peer_col='KKOV'):
+    """
+    Percentile of every group's KPI among its peers (groups with the same KKOV, hence the same grade).
+    Percentile = share of peers with the same or a lower value (0-100]; undefined KPIs stay NaN.
+    """
+    peers = kpi_table.groupby(peer_col, observed=True)
+    ranks = kpi_table[GROUP_COLS + [peer_col]].copy()
+    ranks['peers'] = peers[peer_col].transform('size')
+    for key in metrics:
+        ranks[key] = (peers[key].rank(method='max', pct=True) * 100).round(0)
+    return ranks
+
+@st.cache_data
+def compute_rankings(year, rounds):
+    """National ranking of all schools/fields for one round selection (all applicants, no grade filter)"""
+    long_df = get_long_format(load_rounds_data(year, tuple(rounds)), load_school_map(), load_kkov_map())
+    if long_df.empty: return pd.DataFrame()
+    capacities = get_group_capacities(long_df, load_capacity_index(year), list(rounds))
+    ranks = rank_within_peers(calculate_kpis_grouped(long_df, capacities))
+    for col in GROUP_COLS + ['KKOV']:
+        ranks[col] = ranks[col].astype(str)
+    return ranks
+
+def get_rankings_path(year):
+    return get_cache_path(CUBE_NAMESPACE, f"PZ{year}_ranking", get_cube_fingerprint(year))
+
+def write_rankings(year):
+    """Precomputes the ranking of every round combination of a year; returns the file path"""
+    tables = [compute_rankings(year, rounds).assign(rounds=rounds_key(rounds)) for rounds in get_round_combinations(year)]
+    path = get_rankings_path(year)
+    write_frame(pd.concat(tables, ignore_index=True), path)
+    return path
+
+@st.cache_resource
+def read_rankings(path):
+    """{rounds key: ranking indexed by (SchoolName, FieldLabel)} from a precomputed rankings file"""
+    table = read_frame(path)
+    return {key: part.drop(columns='rounds').set_index(GROUP_COLS) for key, part in table.groupby('rounds', sort=False)}
+
+def load_rankings(year):
+    """Rankings of a year if precomputed for the current data, else None (misses are not cached)"""
+    path = get_rankings_path(year)
+    return read_rankings(path) if os.path.exists(path) else None
+
+def get_group_ranks(year, rounds, school, fields):
+    """Ranking rows of a school's fields for the selected rounds (precomputed, or computed once and cached)"""
+    rankings = load_rankings(year) or {}
+    table = rankings.get(rounds_key(rounds))
+    if table is None:
+        table = compute_rankings(year, tuple(sorted(rounds)))
+        if table.empty: return table
+        table = table.set_index(GROUP_COLS)
+    keys = [(str(school), str(f)) for f in fields]
+    return table[table.index.isin(keys)]
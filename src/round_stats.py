@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+from .analysis import group_kpi_stats, ranked_sum, elite_size, bottom_size, REJECT_STATS
+
+GROUP_COLS = ['SchoolName', 'FieldLabel']
+
+# Per-round statistics that combine across rounds by addition
+ADDITIVE_STATS = ['total_apps', 'total_admitted', 'gave_up_count', 'cap_count', 'adm_cnt_reg', 'adm_cnt_exc', 'adm_sum_reg'] + \
+    [f'{prefix}_{stat}' for prefix, _ in REJECT_STATS for stat in ('cnt_reg', 'cnt_exc', 'sum_reg', 'total')] + \
+    ['p1_count', 'p1_admitted', 'intake_p3p_count']
+
+TAIL_TOP = 'top'
+TAIL_BOTTOM = 'bottom'
+
+def _tail_rows(gid, values, mask, k, ascending):
+    """Row positions of the k[row] lowest/highest values of every group among rows where mask holds"""
+    rows = np.flatnonzero(mask)
+    v = values[rows]
+    rows = rows[np.lexsort((v if ascending else -v, gid[rows]))]
+    g = gid[rows]
+    rank = np.arange(len(rows)) - np.searchsorted(g, g, side='left')
+    return rows[rank < k[rows]]
+
+def summarize_rounds(long_df):
+    """
+    Mergeable KPI summaries per (round, school, field) of a long frame spanning one or more rounds:
+      - groups: one row per (SchoolName, FieldLabel); the other tables refer to it by position ('group')
+      - stats:  additive counts/sums, minimum score and the group's first row (RED_IZO, KKOV, Priority)
+      - tails:  top points of regular applicants and bottom points of regular admitted, as many as
+                the all-round totals can require (top 10 % / bottom 25 %), so any subset of rounds merges exactly
+      - points: TotalPoints value counts (boundary density around any merged minimum)
+    """
+    if long_df.empty: return None
+    by = ['kolo'] + GROUP_COLS
+    all_rounds = long_df.groupby(GROUP_COLS, observed=True, sort=True)
+    group = all_rounds.ngroup().to_numpy()
+    groups = all_rounds.size().index.to_frame(index=False).astype(str)
+
+    stats = group_kpi_stats(long_df, by)
+    stats['first_priority'] = long_df.groupby(by, observed=True, sort=True)['Priority'].first()
+    stats = stats[['RED_IZO', 'KKOV', 'first_priority', 'min_score'] + ADDITIVE_STATS].reset_index()
+    stats.insert(0, 'group', groups.set_index(GROUP_COLS).index.get_indexer(pd.MultiIndex.from_frame(stats[GROUP_COLS].astype(str))))
+    stats = stats.drop(columns=GROUP_COLS)
+    stats[['RED_IZO', 'KKOV']] = stats[['RED_IZO', 'KKOV']].astype(str)
+
+    # Tails sized by the all-round totals (upper bound of any merged top 10 % / bottom 25 %)
+    pts = long_df['TotalPoints'].to_numpy(dtype='float64')
+    exempt = long_df['IsExempt'].to_numpy(dtype=bool)
+    reg_adm = (long_df['Prijat'] == 1).to_numpy() & ~exempt
+    round_group = long_df.groupby(by, observed=True, sort=True).ngroup().to_numpy()
+    n = len(groups)
+    top_k = elite_size(np.bincount(group, minlength=n))[group]
+    bottom_k = bottom_size(np.bincount(group[reg_adm], minlength=n))[group]
+    kolo = long_df['kolo'].to_numpy()
+    tails = []
+    for kind, rows in ((TAIL_TOP, _tail_rows(round_group, pts, ~exempt, top_k, ascending=False)),
+                       (TAIL_BOTTOM, _tail_rows(round_group, pts, reg_adm, bottom_k, ascending=True))):
+        tails.append(pd.DataFrame({'group': group[rows], 'kolo': kolo[rows], 'kind': kind, 'value': pts[rows]}))
+
+    points = pd.DataFrame({'group': group, 'kolo': kolo, 'value': pts}).value_counts().rename('count').reset_index()
+    return {'groups': groups, 'stats': stats, 'tails': pd.concat(tails, ignore_index=True), 'points': points}
+
+def _group_index(summary):
+    """MultiIndex of the summary's groups, built once and kept in the summary"""
+    if 'index' not in summary:
+        summary['index'] = pd.MultiIndex.from_frame(summary['groups'])
+    return summary['index']
+
+def get_group_ids(summary, keys):
+    """Summary group positions of (SchoolName, FieldLabel) keys, -1 for unknown groups"""
+    return _group_index(summary).get_indexer(pd.MultiIndex.from_tuples([tuple(str(k) for k in key) for key in keys], names=GROUP_COLS))
+
+def merge_rounds(summary, rounds, group_ids=None):
+    """
+    Combines the per-round summaries of the selected rounds into per-group KPI statistics
+    (same format as analysis.group_kpi_stats, indexed by SchoolName/FieldLabel).
+    The group's RED_IZO/KKOV come from its first row in the combined frame (lowest priority
+    slot, then earliest round), so capacity lookups match the live pipeline.
+    """
+    rounds = list(rounds)
+    def select(frame):
+        mask = np.isin(frame['kolo'].to_numpy(), rounds)
+        if group_ids is not None:
+            mask &= np.isin(frame['group'].to_numpy(), group_ids)
+        return mask
+
+    stats = summary['stats']
+    rows = np.flatnonzero(select(stats))
+    group = stats['group'].to_numpy()[rows]
+    rows = rows[np.lexsort((stats['kolo'].to_numpy()[rows], stats['first_priority'].to_numpy()[rows], group))]
+    group = stats['group'].to_numpy()[rows]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]]) if len(rows) else np.array([], dtype=int)
+    uniq = group[starts]
+    n = len(uniq)
+
+    first = rows[starts]
+    merged = {'RED_IZO': stats['RED_IZO'].to_numpy()[first], 'KKOV': stats['KKOV'].to_numpy()[first]}
+    sums = np.add.reduceat(stats[ADDITIVE_STATS].to_numpy(dtype='float64')[rows], starts) if n else np.empty((0, len(ADDITIVE_STATS)))
+    for i, col in enumerate(ADDITIVE_STATS):
+        merged[col] = sums[:, i] if col.endswith('_sum_reg') else sums[:, i].astype('int64')
+    merged['min_score'] = np.fmin.reduceat(stats['min_score'].to_numpy(dtype='float64')[rows], starts) if n else np.empty(0)
+
+    # Top 10 % / bottom 25 % re-ranked over the union of the stored tails
+    tails = summary['tails']
+    mask = select(tails)
+    pos = np.searchsorted(uniq, tails['group'].to_numpy()[mask])
+    values = tails['value'].to_numpy()[mask]
+    is_top = (tails['kind'].to_numpy()[mask] == TAIL_TOP)
+    merged['elite_cnt'], merged['elite_sum'] = ranked_sum(pos, values, is_top, elite_size(merged['total_apps']), n, ascending=False)
+    merged['bottom_cnt'], merged['bottom_sum'] = ranked_sum(pos, values, ~is_top, bottom_size(merged['adm_cnt_reg']), n, ascending=True)
+
+    # Boundary count: applications within +-5 points of the merged minimum
+    points = summary['points']
+    mask = select(points)
+    pos = np.searchsorted(uniq, points['group'].to_numpy()[mask])
+    values = points['value'].to_numpy()[mask]
+    row_min = merged['min_score'][pos]
+    near = (values >= row_min - 5) & (values <= row_min + 5)
+    merged['boundary_count'] = np.bincount(pos[near], weights=points['count'].to_numpy()[mask][near], minlength=n).astype('int64')
+
+    return pd.DataFrame(merged, index=_group_index(summary)[uniq])
@@ -0,0 +1,124 @@
+import re
+import hashlib
+import logging
+from .utils import clean_col_name
+
+logger = logging.getLogger(__name__)
+
+# Wide columns the app reads (long format, sidebar options, flows, co-applications); the
+# remaining export columns (forma, zkraceno, zrizovatel, ...) are never parsed
+SLOT_FIELDS = ('redizo', 'kkov', 'prijat', 'duvod_neprijeti')
+APPLICANT_COLUMNS = ['rok', 'kolo', 'c_procentni_skor', 'm_procentni_skor'] + [f'ss{i}_{f}' for i in range(1, 6) for f in SLOT_FIELDS]
+
+# Conversion of every used column (see data_loader._typed_column)
+COLUMN_TYPES = {'rok': 'int', 'kolo': 'int', 'c_procentni_skor': 'float', 'm_procentni_skor': 'float'}
+COLUMN_TYPES.update({f'ss{i}_{f}': t for i in range(1, 6)
+                     for f, t in (('redizo', 'float'), ('kkov', 'text'), ('prijat', 'flag'), ('duvod_neprijeti', 'text'))})
+
+def normalize_column_name(col):
+    """Normalize 2024 mangled columns to 2025 standard names with robust string matching"""
+    original = str(col)
+    c = clean_col_name(col)
+    
+    # 1. Subject Scores
+    if ('jl' in c and 'procent' in c) or ('jl' in c and 'lep' in c):
+        return 'c_procentni_skor'
+    if ('ma' in c and 'procent' in c) or ('ma' in c and 'lep' in c):
+        return 'm_procentni_skor'
+    
+    # 2. Priority Columns (ss1..ss5)
+    match = re.search(r's(\d)', c) or re.search(r's(\d)', c) # Handle cases where regex might fail due to mangling
+    # Fallback to simple indices if digit is near 's'
+    if not match:
+        for i in range(1, 6):
+            if f's{i}' in c or f's{i}' in c: 
+                idx = str(i)
+                break
+        else: idx = None
+    else: idx = match.group(1)
+
+    if idx:
+        new_prefix = f'ss{idx}_'
+        if 'izo' in c or 'redizo' in c: return f'{new_prefix}redizo'
+        if 'kkov' in c or 'obor' in c or 'kd' in c: return f'{new_prefix}kkov'
+        if 'prijat' in c or 'pijat' in c: return f'{new_prefix}prijat'
+        if 'duvod' in c: return f'{new_prefix}duvod_neprijeti'
+    
+    if 'kolo' in c: return 'kolo'
+    if 'rok' in c: return 'rok'
+    
+    return original
+
+def resolve_header(header):
+    """Heuristic resolution: normalized, deduplicated column names (the first occurrence keeps the plain name)"""
+    unique_cols = []
+    seen = set()
+    for c in (normalize_column_name(c) for c in header):
+        if c not in seen:
+            unique_cols.append(c)
+            seen.add(c)
+        else:
+            unique_cols.append(f"{c}_dup_{len(seen)}")
+    return unique_cols
+
+def header_fingerprint(header):
+    """Stable key of a header row (exact names in order)"""
+    return hashlib.sha1('\x1f'.join('' if h is None else str(h) for h in header).encode('utf-8')).hexdigest()[:16]
+
+def _by_field(*names):
+    """Slot columns grouped by field: ss1_x .. ss5_x, ss1_y .. ss5_y"""
+    return tuple(n.format(i=i) for n in names for i in range(1, 6))
+
+def _by_slot(*names):
+    """Slot columns grouped by slot: ss1_x, ss1_y, .., ss2_x, ss2_y, .."""
+    return tuple(n.format(i=i) for i in range(1, 6) for n in names)
+
+# Known layouts of the applicant exports: header row as published by Cermat and the mapping of
+# the used columns (export name -> APPLICANT_COLUMNS name). New layouts are added here.
+SCHEMAS = {
+    'applicants-2024': {
+        'version': 2024,
+        'header': ('rok', 'kolo', 'c_m_procentni_skor', 'c_procentni_skor', 'm_procentni_skor')
+                  + _by_slot('SS{i}_izo', 'ss{i}_zrizovatel', 'ss{i}_kkov', 'ss{i}_forma', 'ss{i}_zkraceno',
+                             'ss{i}_prijat', 'ss{i}_duvod_neprijeti'),
+        'columns': {'rok': 'rok', 'kolo': 'kolo', 'c_procentni_skor': 'c_procentni_skor', 'm_procentni_skor': 'm_procentni_skor',
+                    **{f'SS{i}_izo': f'ss{i}_redizo' for i in range(1, 6)},
+                    **{f'ss{i}_{f}': f'ss{i}_{f}' for i in range(1, 6) for f in ('kkov', 'prijat', 'duvod_neprijeti')}},
+    },
+    'applicants-2025': {
+        'version': 2025,
+        'header': ('rok', 'kolo') + _by_field('ss{i}_redizo', 'ss{i}_zrizovatel', 'ss{i}_kkov', 'ss{i}_forma', 'ss{i}_zkraceno',
+                                              'ss{i}_prijat', 'ss{i}_duvod_neprijeti')
+                  + ('c_m_procentni_skor', 'c_procentni_skor', 'm_procentni_skor'),
+        'columns': {c: c for c in APPLICANT_COLUMNS},
+    },
+}
+
+def _compile(name, names):
+    """Resolution of a header from its per-position names: [(used column, position)] in header order and their types"""
+    positions = [(c, i) for i, c in enumerate(names) if c in COLUMN_TYPES]
+    return {'schema': name, 'columns': positions, 'types': {c: COLUMN_TYPES[c] for c, _ in positions}}
+
+_KNOWN = {header_fingerprint(s['header']): _compile(name, [s['columns'].get(h) for h in s['header']])
+          for name, s in SCHEMAS.items()}
+
+def heuristic_schema(header):
+    """Resolution of a header by the normalize_column_name heuristic (unknown layouts)"""
+    return _compile(None, resolve_header(header))
+
+# Resolutions of headers seen in this process (known ones precompiled above)
+_resolved = dict(_KNOWN)
+
+def resolve_schema(header):
+    """
+    Resolves a workbook header row to the positions and types of the used columns. Known layouts
+    (SCHEMAS, matched by header_fingerprint) use their fixed mapping; an unknown layout falls back
+    to the normalize_column_name heuristic once and is logged.
+    """
+    header = tuple(header)
+    key = header_fingerprint(header)
+    if key not in _resolved:
+        _resolved[key] = heuristic_schema(header)
+        logger.warning("Neznámé rozložení záhlaví (otisk %s), použita heuristika: %s", key,
+                       {header[i]: c for c, i in _resolved[key]['columns']})
+    return _resolved[key]
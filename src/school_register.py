@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from .cache import load_cached_frame
+
+REGISTER_FILE = 'skoly.csv'
+
+def read_register_csv(path):
+    """Reads the raw school register (cp1250 export, utf-8 fallback)"""
+    try:
+        return pd.read_csv(path, encoding='cp1250', sep=';', low_memory=False)
+    except UnicodeDecodeError:
+        return pd.read_csv(path, encoding='utf-8', sep=';', low_memory=False)
+
+def _as_text(col):
+    """Column as stripped strings, missing values rendered as 'nan' (same as str(value))"""
+    return col.astype(object).where(col.notna(), 'nan').astype(str).str.strip()
+
+def _first_wins(keys, values):
+    """Keeps the first value for every key (keys/values are in priority order)"""
+    pairs = pd.DataFrame({'key': keys, 'value': values}).drop_duplicates('key', keep='first')
+    return pairs.set_index('key')['value']
+
+def build_school_register(path=REGISTER_FILE):
+    """
+    Parses skoly.csv once into a compact lookup table sorted by numeric key.
+    Every IZO (facility) and RED_IZO (institution) of the register is a key; for each key:
+      - name:   display name (school rows win over other facilities, first row wins otherwise)
+      - redizo: institution REDIZO the key belongs to (first row in file order wins)
+    Rows whose IZO or RED_IZO is not numeric are skipped.
+    """
+    df = read_register_csv(path)
+
+    is_school = df['Nazev'].fillna('').astype(str).str.contains('škola|Gymnázium|Lyceum', case=False)
+    riz = pd.to_numeric(df['RED_IZO'], errors='coerce')
+    iz = pd.to_numeric(df['IZO'], errors='coerce')
+    valid = np.isfinite(riz) & np.isfinite(iz)
+    df, is_school = df[valid], is_school[valid].to_numpy()
+    riz, iz = riz[valid].astype('int64').to_numpy(), iz[valid].astype('int64').to_numpy()
+
+    # Name: full name, falling back to the short 'Nazev', with the town appended if missing
+    full_name = _as_text(df['Plny_nazev'])
+    name = full_name.where((full_name != '') & (full_name.str.lower() != 'nan'), _as_text(df['Nazev']))
+    if 'Misto' in df.columns:
+        misto = df['Misto'].fillna('').astype(str).str.strip()
+        name_l = name.str.lower().to_numpy(dtype=str)
+        misto_l = misto.str.lower().to_numpy(dtype=str)
+        needs_town = (misto != '').to_numpy() & (np.char.find(name_l, misto_l) < 0)
+        name = name.where(~needs_town, name + " (" + misto + ")")
+    name = name.to_numpy(dtype=object)
+
+    # Names: schools first (stable), RED_IZO before IZO within a row
+    order = np.argsort(~is_school, kind='stable')
+    names = _first_wins(np.column_stack([riz[order], iz[order]]).ravel(), np.repeat(name[order], 2))
+
+    # Institution: file order, IZO before the REDIZO self-mapping within a row
+    redizos = _first_wins(np.column_stack([iz, riz]).ravel(), np.repeat(riz, 2))
+
+    register = pd.DataFrame({'key': names.index.to_numpy(dtype='int64')})
+    register['name'] = pd.Categorical(names.to_numpy())
+    register['redizo'] = redizos.reindex(names.index).to_numpy(dtype='int64')
+    return register.sort_values('key', kind='stable').reset_index(drop=True)
+
+def load_school_register(path=REGISTER_FILE):
+    """School register lookup table, served from the on-disk cache after the first build"""
+    return load_cached_frame(path, 'register', build_school_register)
+
+def lookup_keys(register, keys):
+    """
+    Vectorized lookup of numeric IZO/REDIZO keys in the sorted register.
+    Returns (positions, found) where positions index register rows for found keys.
+    """
+    reg_keys = register['key'].to_numpy()
+    keys = np.asarray(keys, dtype='int64')
+    pos = np.searchsorted(reg_keys, keys)
+    pos = np.minimum(pos, max(len(reg_keys) - 1, 0))
+    found = (reg_keys[pos] == keys) if len(reg_keys) else np.zeros(len(keys), dtype=bool)
+    return pos, found
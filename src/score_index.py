@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .data_loader import load_rounds_data, load_school_map, load_kkov_map, get_long_format
+from .capacity import load_capacity_index, lookup_regions
+
+GROUP_COLS = ['SchoolName', 'FieldLabel']
+
+# Points are at most 100, so (group position * stride + points) keeps every group's points apart
+_POINT_STRIDE = 1000.0
+
+def build_score_index(long_df, capacity_index):
+    """
+    Score query index of the regular admitted applicants:
+      - groups: (SchoolName, FieldLabel, RED_IZO, KKOV, Grade, region, admitted, min_score), sorted by min_score
+      - min_scores: the sorted minimums (binary search for "admitted with N points")
+      - keys / starts: admitted points of every group, sorted within the group and stored one after
+        another as position * stride + points, so one searchsorted ranks a score in all groups at once
+    """
+    adm = long_df[(long_df['Prijat'] == 1).to_numpy() & ~long_df['IsExempt'].to_numpy(dtype=bool)]
+    if adm.empty: return None
+    grouped = adm.groupby(GROUP_COLS, observed=True, sort=True)
+    groups = grouped[['RED_IZO', 'KKOV', 'Grade']].first().astype(str)
+    groups['admitted'] = grouped.size()
+    groups['min_score'] = grouped['TotalPoints'].min()
+    groups['region'] = lookup_regions(capacity_index, groups['RED_IZO'])
+    groups = groups.reset_index().astype({c: str for c in GROUP_COLS})
+
+    order = np.argsort(groups['min_score'].to_numpy(), kind='stable')
+    pos = np.empty(len(order), dtype='int64')
+    pos[order] = np.arange(len(order))
+    groups = groups.iloc[order].reset_index(drop=True)
+
+    keys = np.sort(pos[grouped.ngroup().to_numpy()] * _POINT_STRIDE + adm['TotalPoints'].to_numpy(dtype='float64'))
+    starts = np.r_[0, np.cumsum(groups['admitted'].to_numpy())[:-1]]
+    return {'groups': groups, 'min_scores': groups['min_score'].to_numpy(), 'keys': keys, 'starts': starts}
+
+def query_score(index, score, grade=None, region=None):
+    """
+    Every group whose last regular admitted had at most `score` points, optionally limited to a grade
+    and region. Adds the margin over the minimum and the share of admitted with a lower or equal score.
+    """
+    if index is None: return pd.DataFrame()
+    n = np.searchsorted(index['min_scores'], score, side='right')
+    result = index['groups'].iloc[:n]
+    if grade: result = result[result['Grade'] == grade]
+    if region: result = result[result['region'] == region]
+    pos = result.index.to_numpy()
+    below = np.searchsorted(index['keys'], pos * _POINT_STRIDE + score, side='right') - index['starts'][pos]
+    return result.assign(margin=score - result['min_score'], share=below / result['admitted'] * 100)
+
+def get_regions(index):
+    """Regions present in the index (for the filter)"""
+    if index is None: return []
+    return sorted(index['groups']['region'].dropna().unique().tolist())
+
+@st.cache_resource
+def get_score_index(year, rounds):
+    """Score index of all applicants of the selected rounds (built once per selection)"""
+    long_df = get_long_format(load_rounds_data(year, tuple(rounds)), load_school_map(), load_kkov_map())
+    if long_df.empty: return None
+    return build_score_index(long_df, load_capacity_index(year))
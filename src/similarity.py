@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .data_loader import load_rounds_data, load_school_map, load_kkov_map, get_long_format
+from .capacity import load_capacity_index, get_group_capacities
+from .analysis import calculate_kpis_grouped
+
+# KPIs describing a school's profile (key -> log-scaled before standardizing)
+SIMILARITY_FEATURES = {
+    'pure_demand_idx': True,
+    'min_score': False,
+    'p1_loyalty': False,
+    'release_rate': False,
+    'capacity': True,
+}
+
+def school_kpi_table(long_df, capacity_index, rounds):
+    """
+    School-level KPIs (calculate_kpis_grouped by SchoolName) with the summed planned capacity of
+    the school's fields; 'capacity' falls back to the admitted count where no capacity is known.
+    """
+    long_df = long_df[(long_df['RED_IZO'].astype(str) != '0').to_numpy()]
+    field_caps = get_group_capacities(long_df, capacity_index, list(rounds))
+    school_caps = pd.Series([c or 0 for c in field_caps.values()],
+                            index=[school for school, _ in field_caps]).groupby(level=0).sum()
+    kpis = calculate_kpis_grouped(long_df, {s: c if c > 0 else None for s, c in school_caps.items()}, by=('SchoolName',))
+    kpis['capacity'] = kpis['planned_capacity'].fillna(kpis['total_admitted'])
+    kpis['SchoolName'] = kpis['SchoolName'].astype(str)
+    return kpis.set_index('SchoolName')
+
+def build_similarity_index(kpis):
+    """
+    Standardized feature matrix (z-scores of SIMILARITY_FEATURES, log1p for skewed ones; an
+    undefined KPI sits at the mean) with precomputed squared norms for brute-force distances.
+    """
+    features = []
+    for key, log_scale in SIMILARITY_FEATURES.items():
+        values = kpis[key].to_numpy(dtype='float64')
+        if log_scale: values = np.log1p(np.clip(values, 0, None))
+        std = np.nanstd(values)
+        z = (values - np.nanmean(values)) / (std if std > 0 else 1)
+        features.append(np.nan_to_num(z))
+    matrix = np.column_stack(features)
+    return {'names': kpis.index, 'features': matrix, 'norms': (matrix ** 2).sum(axis=1), 'kpis': kpis[list(SIMILARITY_FEATURES)]}
+
+def nearest_schools(index, school, k=10):
+    """k most similar schools (Euclidean distance in the standardized KPI space), closest first"""
+    pos = index['names'].get_indexer([school])[0]
+    if pos < 0: return pd.DataFrame()
+    q = index['features'][pos]
+    dist2 = index['norms'] - 2 * index['features'] @ q + index['norms'][pos]
+    dist2[pos] = np.inf
+    k = min(k, len(dist2) - 1)
+    if k <= 0: return pd.DataFrame()
+    top = np.argpartition(dist2, k - 1)[:k]
+    top = top[np.argsort(dist2[top], kind='stable')]
+    return index['kpis'].iloc[top].assign(distance=np.sqrt(np.maximum(dist2[top], 0)))
+
+@st.cache_resource
+def get_similarity_index(year, rounds):
+    """Similarity index of all schools for the selected rounds (built once per selection)"""
+    long_df = get_long_format(load_rounds_data(year, tuple(rounds)), load_school_map(), load_kkov_map())
+    if long_df.empty: return None
+    return build_similarity_index(school_kpi_table(long_df, load_capacity_index(year), rounds))
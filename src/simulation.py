@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .data_loader import load_rounds_data, load_school_map, load_kkov_map, get_long_format
+from .capacity import load_capacity_index, get_group_capacities
+from .analysis import calculate_kpis_grouped
+from .utils import REASON_ADMITTED, REASON_HIGHER_PRIORITY, REASON_CAPACITY, REASON_FAILED
+
+GROUP_COLS = ['SchoolName', 'FieldLabel']
+
+# KPIs reported for a what-if scenario (before / after)
+SCENARIO_KPIS = ['planned_capacity', 'total_admitted', 'vacant_seats', 'min_score', 'avg_admitted', 'cap_count', 'lost_count']
+
+def build_market(long_df, capacity_index):
+    """
+    Applications of a long frame prepared for the allocation, one market per round (kolo):
+      - eligible applications of regular applicants sorted by (round, student, priority)
+      - school preference: TotalPoints, ties broken in favour of the real outcome, then student
+      - base capacity per group: planned capacity of the group's round (real intake where unknown),
+        minus the seats taken by exempt applicants (their outcome is kept as is)
+    """
+    grouped = long_df.groupby(GROUP_COLS, observed=True, sort=True)
+    group = grouped.ngroup().to_numpy()
+    groups = grouped.size().index
+    n_groups = len(groups)
+
+    kolo = long_df['kolo'].to_numpy()
+    student = pd.MultiIndex.from_arrays([kolo, long_df['Student_UUID'].to_numpy()]).factorize()[0]
+    real = long_df['Prijat'].to_numpy() == 1
+    exempt = long_df['IsExempt'].to_numpy(dtype=bool)
+    filled = (long_df['RED_IZO'].astype(str) != '0').to_numpy()
+    eligible = filled & ~exempt & (long_df['ReasonCode'].to_numpy() != REASON_FAILED)
+
+    # Capacity of every group in its own round (groups are per round in practice: one data file per round)
+    planned = np.full(n_groups, np.nan)
+    for r in np.unique(kolo):
+        in_round = kolo == r
+        caps = get_group_capacities(long_df[in_round], capacity_index, [int(r)])
+        ids = np.unique(group[in_round])
+        planned[ids] = [np.nan if (c := caps.get(key)) is None else c for key in groups[ids]]
+    intake = np.bincount(group[real], minlength=n_groups)
+    base = np.where(np.isnan(planned), intake, planned)
+    fixed = np.bincount(group[real & exempt], minlength=n_groups)
+
+    # Preference position: rows sorted by (group, points desc, real admission first, student)
+    pts = long_df['TotalPoints'].to_numpy(dtype='float64')
+    order = np.lexsort((student, ~real, -pts, group))
+    pref = np.empty(len(order), dtype='int64')
+    pref[order] = np.arange(len(order))
+
+    rows = np.flatnonzero(eligible)
+    rows = rows[np.lexsort((long_df['Priority'].to_numpy()[rows], student[rows]))]
+    return {
+        'groups': groups, 'rows': rows, 'student': student[rows], 'group': group[rows], 'pref': pref[rows],
+        'planned': planned, 'base_capacity': np.maximum(base - fixed, 0).astype('int64'), 'fixed': fixed,
+    }
+
+def deferred_acceptance(market, capacity):
+    """
+    Student-proposing deferred acceptance (the priority-based allocation of the admission system):
+    every free student applies to their next choice, every group keeps the best `capacity`
+    applicants among those held and the new ones, until nobody has a choice left.
+    Vectorized over all students per step. Returns the positions (into market rows) admitted.
+    """
+    stud, grp, pref = market['student'], market['group'], market['pref']
+    if len(stud) == 0: return np.array([], dtype='int64')
+    starts = np.flatnonzero(np.r_[True, stud[1:] != stud[:-1]])
+    ends = np.r_[starts[1:], len(stud)]
+    next_app = starts.copy()
+    matched = np.zeros(len(starts), dtype=bool)
+    held = np.array([], dtype='int64')
+    owner = np.repeat(np.arange(len(starts)), ends - starts)
+
+    while True:
+        free = np.flatnonzero(~matched & (next_app < ends))
+        if len(free) == 0: break
+        proposals = next_app[free]
+        next_app[free] += 1
+        cand = np.concatenate([held, proposals])
+        cand = cand[np.argsort(pref[cand], kind='stable')]
+        g = grp[cand]
+        rank = np.arange(len(cand)) - np.searchsorted(g, g, side='left')
+        keep = rank < capacity[g]
+        matched[owner[cand[~keep]]] = False
+        held = cand[keep]
+        matched[owner[held]] = True
+    return np.sort(held)
+
+def apply_allocation(long_df, market, admitted):
+    """
+    Copy of the long frame with Prijat / ReasonCode rewritten by a simulated allocation: admitted
+    applications, lower choices of admitted students (higher priority admitted) and the rest of the
+    eligible applications (capacity). Failed and exempt applications keep their real outcome.
+    AcceptedDetail still reflects the real outcome.
+    """
+    rows = market['rows']
+    prijat = long_df['Prijat'].to_numpy().copy()
+    codes = long_df['ReasonCode'].to_numpy().copy()
+    is_adm = np.zeros(len(rows), dtype=bool)
+    is_adm[admitted] = True
+
+    # Priority of each student's admission (6 = none); rows are sorted by student, priority
+    prio = long_df['Priority'].to_numpy()[rows]
+    stud_prio = np.full(market['student'].max() + 1 if len(rows) else 0, 6)
+    np.minimum.at(stud_prio, market['student'][is_adm], prio[is_adm])
+    lower = prio > stud_prio[market['student']]
+
+    prijat[rows] = np.where(is_adm, 1, 2)
+    codes[rows] = np.where(is_adm, REASON_ADMITTED, np.where(lower, REASON_HIGHER_PRIORITY, REASON_CAPACITY))
+    return long_df.assign(Prijat=prijat, ReasonCode=codes)
+
+def _capacity_vector(market, overrides):
+    """Base capacities with {(SchoolName, FieldLabel): planned capacity} overrides applied"""
+    capacity = market['base_capacity'].copy()
+    planned = market['planned'].copy()
+    if overrides:
+        ids = market['groups'].get_indexer(pd.MultiIndex.from_tuples([tuple(map(str, k)) for k in overrides]))
+        for gid, seats in zip(ids, overrides.values()):
+            if gid < 0: continue
+            capacity[gid] = max(int(seats) - market['fixed'][gid], 0)
+            planned[gid] = seats
+    return capacity, planned
+
+def simulate_kpis(long_df, market, overrides=None):
+    """KPI table (calculate_kpis_grouped) of a simulated allocation with capacity overrides"""
+    capacity, planned = _capacity_vector(market, overrides)
+    sim_df = apply_allocation(long_df, market, deferred_acceptance(market, capacity))
+    caps = {key: None if np.isnan(c) else int(c) for key, c in zip(market['groups'], planned)}
+    return calculate_kpis_grouped(sim_df, caps).set_index(GROUP_COLS)
+
+@st.cache_resource
+def load_market(year, rounds):
+    """Long frame of all applicants of the selected rounds with its allocation market (shared, read-only)"""
+    long_df = get_long_format(load_rounds_data(year, tuple(rounds)), load_school_map(), load_kkov_map())
+    if long_df.empty: return long_df, None
+    return long_df, build_market(long_df, load_capacity_index(year))
+
+@st.cache_data
+def simulate_baseline(year, rounds):
+    """Simulated allocation with the planned capacities (reference for scenarios)"""
+    long_df, market = load_market(year, tuple(rounds))
+    return simulate_kpis(long_df, market) if market else pd.DataFrame()
+
+def run_scenario(year, rounds, overrides):
+    """
+    What-if analysis: re-runs the allocation of the selected rounds with {(SchoolName, FieldLabel):
+    planned capacity} overrides. Returns (baseline, scenario) KPI tables of the groups whose
+    SCENARIO_KPIS changed; both are simulated so the difference is due to the overrides only.
+    """
+    long_df, market = load_market(year, tuple(sorted(rounds)))
+    if market is None: return pd.DataFrame(), pd.DataFrame()
+    baseline = simulate_baseline(year, tuple(sorted(rounds)))[SCENARIO_KPIS]
+    scenario = simulate_kpis(long_df, market, overrides)[SCENARIO_KPIS]
+    changed = ~((baseline == scenario) | (baseline.isna() & scenario.isna())).all(axis=1)
+    return baseline[changed], scenario[changed]
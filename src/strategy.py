@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .data_loader import load_rounds_data, load_school_map, load_kkov_map, get_long_format
+from .histograms import build_histograms, bin_index, N_BINS, BIN_WIDTH
+from .utils import REASON_ADMITTED, REASON_CAPACITY, REASON_FAILED
+
+GROUP_COLS = ['SchoolName', 'FieldLabel']
+N_SLOTS = 5
+
+# Score window (+- points) pooled around each bin, and pseudo-counts pulling a sparse
+# slot curve towards its field curve and a sparse field curve towards the all-field curve
+WINDOW_POINTS = 5
+PRIOR_WEIGHT = 2.0
+
+# Informative outcomes: admitted vs. rejected for capacity / conditions. "Admitted to a higher
+# priority" says nothing about this field (censored) and is left out, as are exempt applicants.
+REJECTED_OUTCOMES = [REASON_CAPACITY, REASON_FAILED]
+
+def _window_sum(counts):
+    """Sum over +-WINDOW_POINTS around every bin (last axis)"""
+    w = int(WINDOW_POINTS / BIN_WIDTH)
+    padded = np.concatenate([np.zeros(counts.shape[:-1] + (1,)), np.cumsum(counts, axis=-1)], axis=-1)
+    hi = np.minimum(np.arange(N_BINS) + w + 1, N_BINS)
+    lo = np.maximum(np.arange(N_BINS) - w, 0)
+    return padded[..., hi] - padded[..., lo]
+
+def _shrink(admitted, total, prior):
+    """Admission rate with PRIOR_WEIGHT pseudo-observations at the prior rate"""
+    return (admitted + PRIOR_WEIGHT * prior) / (total + PRIOR_WEIGHT)
+
+def build_admission_model(long_df):
+    """
+    P(admitted | score, priority slot) of every (SchoolName, FieldLabel), from the 0.5-point
+    histograms of regular applicants per slot. Rates are pooled over a +-5 point window,
+    shrunk slot -> field -> all fields, and made non-decreasing in score.
+    Returns {'index': group index, 'prob': float32 [group, slot, bin]}.
+    """
+    long_df = long_df[(long_df['RED_IZO'].astype(str) != '0').to_numpy()]
+    hists = build_histograms(long_df, by=GROUP_COLS + ['Priority'])
+    counts = hists['counts'][:, :, 0].astype('float64')  # regular applicants only
+    admitted = counts[:, REASON_ADMITTED]
+    total = admitted + counts[:, REJECTED_OUTCOMES].sum(axis=1)
+
+    # Scatter (group, slot) histograms into a [group, slot, bin] array
+    keys = hists['index'].to_frame(index=False)
+    groups = pd.MultiIndex.from_frame(keys[GROUP_COLS].astype(str)).unique()
+    gid = groups.get_indexer(pd.MultiIndex.from_frame(keys[GROUP_COLS].astype(str)))
+    slot = keys['Priority'].to_numpy(dtype='int64') - 1
+    adm = np.zeros((len(groups), N_SLOTS, N_BINS))
+    tot = np.zeros((len(groups), N_SLOTS, N_BINS))
+    np.add.at(adm, (gid, slot), admitted)
+    np.add.at(tot, (gid, slot), total)
+
+    adm, tot = _window_sum(adm), _window_sum(tot)
+    overall = _shrink(adm.sum(axis=(0, 1)), tot.sum(axis=(0, 1)), 0.5)
+    field = _shrink(adm.sum(axis=1), tot.sum(axis=1), overall)
+    prob = _shrink(adm, tot, field[:, None, :])
+    return {'index': groups, 'prob': np.maximum.accumulate(prob, axis=-1).astype('float32')}
+
+def admission_probability(model, keys, score):
+    """[len(keys), N_SLOTS] probabilities of the (SchoolName, FieldLabel) keys at a score (0 for unknown fields)"""
+    ids = model['index'].get_indexer(pd.MultiIndex.from_tuples([tuple(map(str, k)) for k in keys]))
+    prob = model['prob'][np.maximum(ids, 0), :, bin_index(score)].astype('float64')
+    prob[ids < 0] = 0
+    return prob
+
+def recommend_applications(prob, utility, max_apps=N_SLOTS):
+    """
+    Best ordered list of up to max_apps candidates: maximizes the expected utility
+    sum_i u(f_i) * p(f_i, slot i) * prod_{j<i} (1 - p(f_j, slot j)), i.e. the applicant ends up
+    at the first admitting field of the list. Depth-first branch and bound seeded with a greedy
+    list; a branch is cut when the value so far plus the remaining probability mass times the
+    best continuation of a relaxation (unused candidates may repeat, solved backwards over the
+    remaining slots) cannot beat the incumbent.
+    prob: [candidates, N_SLOTS], utility: [candidates]. Returns (candidate positions, expected utility).
+    """
+    n = len(utility)
+    max_apps = min(max_apps, n, prob.shape[1])
+    if n == 0 or max_apps == 0: return [], 0.0
+    prob = np.asarray(prob, dtype='float64')[:, :max_apps]
+    gain = prob * np.asarray(utility, dtype='float64')[:, None]
+    # Candidates in decreasing order of their best gain: good lists are found early
+    order = np.argsort(-gain.max(axis=1), kind='stable')
+    prob, gain = prob[order], gain[order]
+
+    # Greedy incumbent: at every slot the candidate adding the most expected utility
+    path, value, mass, used = [], 0.0, 1.0, np.zeros(n, dtype=bool)
+    for s in range(max_apps):
+        i = int(np.argmax(np.where(used, -1.0, gain[:, s])))
+        path.append(i); used[i] = True
+        value += mass * gain[i, s]; mass *= 1 - prob[i, s]
+    best = {'value': value, 'path': path}
+
+    def bound(used, s):
+        v = 0.0
+        for t in range(max_apps - 1, s - 1, -1):
+            v = np.max(np.where(used, 0.0, gain[:, t] + (1 - prob[:, t]) * v))
+        return v
+
+    def search(path, used, value, mass):
+        if value > best['value']:
+            best.update(value=value, path=list(path))
+        s = len(path)
+        if s == max_apps or mass <= 0: return
+        if value + mass * bound(used, s) <= best['value'] + 1e-12: return
+        for i in np.flatnonzero(~used & (gain[:, s] > 0)):
+            used[i] = True
+            path.append(int(i))
+            search(path, used, value + mass * gain[i, s], mass * (1 - prob[i, s]))
+            path.pop()
+            used[i] = False
+
+    search([], np.zeros(n, dtype=bool), 0.0, 1.0)
+    return [int(order[i]) for i in best['path']], float(best['value'])
+
+@st.cache_resource
+def get_admission_model(year, rounds):
+    """Admission probability model of the selected rounds (all applicants, built once per selection)"""
+    long_df = get_long_format(load_rounds_data(year, tuple(rounds)), load_school_map(), load_kkov_map())
+    if long_df.empty: return None
+    return build_admission_model(long_df)
@@ -0,0 +1,105 @@
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .cache import get_cache_path, read_frame, write_frame
+from .catalog import get_available_years, get_available_rounds
+from .data_loader import load_year_data, load_school_map, load_kkov_map, load_izo_to_redizo_map, get_long_format
+from .capacity import load_capacity_index, lookup_capacities
+from .analysis import calculate_kpis_grouped
+from .kpi_cube import CUBE_NAMESPACE, get_cube_fingerprint
+from .ui_components import COMPARABLE_METRICS
+
+# Group key shared by all years: institution REDIZO (facility IZOs translated) and stripped KKOV
+TREND_KEYS = ['REDIZO', 'KKOV_CODE']
+TREND_METRICS = list(COMPARABLE_METRICS.values())
+
+def harmonize_groups(long_df, izo_to_redizo):
+    """Adds the cross-year group key (TREND_KEYS), translated once per category instead of per row"""
+    riz = long_df['RED_IZO'].astype('category')
+    kkov = long_df['KKOV'].astype('category')
+    redizo = np.array([izo_to_redizo.get(str(r), str(r)) for r in riz.cat.categories] + ['0'], dtype=object)
+    kkov_code = np.array([str(k).strip() for k in kkov.cat.categories] + ['nan'], dtype=object)
+    return long_df.assign(REDIZO=redizo[riz.cat.codes.to_numpy()], KKOV_CODE=kkov_code[kkov.cat.codes.to_numpy()])
+
+def build_year_partition(year):
+    """KPIs of every (REDIZO, KKOV) of one year (all rounds, all applicants) with a 'year' column"""
+    long_df = get_long_format(load_year_data(year), load_school_map(), load_kkov_map())
+    if long_df.empty: return pd.DataFrame()
+    long_df = harmonize_groups(long_df[(long_df['RED_IZO'].astype(str) != '0').to_numpy()], load_izo_to_redizo_map())
+    keys = long_df.groupby(TREND_KEYS, sort=True).size().index
+    caps = lookup_capacities(load_capacity_index(year), keys, get_available_rounds(year))
+    kpis = calculate_kpis_grouped(long_df, dict(zip(keys, caps)), by=TREND_KEYS)
+    return kpis[TREND_KEYS + TREND_METRICS].assign(year=int(year))
+
+def get_partition_path(year):
+    return get_cache_path(CUBE_NAMESPACE, f"PZ{year}_trend", get_cube_fingerprint(year))
+
+def write_year_partition(year):
+    """Stores the KPI partition of a year; returns the file path"""
+    path = get_partition_path(year)
+    write_frame(build_year_partition(year), path)
+    return path
+
+@st.cache_resource
+def load_year_partition(year):
+    """KPI partition of a year, read from the cache directory (built and stored on first use)"""
+    path = get_partition_path(year)
+    if os.path.exists(path): return read_frame(path)
+    partition = build_year_partition(year)
+    if not partition.empty: write_frame(partition, path)
+    return partition
+
+def load_multi_year(years=None):
+    """Year-partitioned KPI store: the partitions of all (or the given) years stacked"""
+    parts = [load_year_partition(y) for y in sorted(years or get_available_years())]
+    parts = [p for p in parts if not p.empty]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+def build_trends(store, metrics=TREND_METRICS):
+    """
+    Time series of every group in one pass: values [group, year, metric] scattered from the
+    store, and year-over-year deltas [group, year - 1, metric] (NaN where a year is missing).
+    """
+    years = sorted(store['year'].unique())
+    codes, keys = pd.MultiIndex.from_frame(store[TREND_KEYS]).factorize()
+    year_pos = np.searchsorted(years, store['year'].to_numpy())
+    values = np.full((len(keys), len(years), len(metrics)), np.nan)
+    values[codes, year_pos] = store[metrics].to_numpy(dtype='float64')
+    return {'keys': keys, 'years': years, 'metrics': list(metrics), 'values': values,
+            'deltas': values[:, 1:] - values[:, :-1]}
+
+def trend_series(trends, keys, metric):
+    """Long frame (REDIZO, KKOV_CODE, year, value) of the given groups for a chart"""
+    ids = trends['keys'].get_indexer(pd.MultiIndex.from_tuples(list(keys)))
+    ids = ids[ids >= 0]
+    m = trends['metrics'].index(metric)
+    values = trends['values'][ids, :, m]
+    frame = pd.DataFrame({
+        'REDIZO': np.repeat(trends['keys'].get_level_values(0)[ids], len(trends['years'])),
+        'KKOV_CODE': np.repeat(trends['keys'].get_level_values(1)[ids], len(trends['years'])),
+        'year': np.tile(trends['years'], len(ids)),
+        'value': values.ravel(),
+    })
+    return frame.dropna(subset=['value'])
+
+def top_movers(trends, metric, n=10):
+    """Groups with the largest change of a metric between the last two years (increases, decreases)"""
+    if len(trends['years']) < 2: return pd.DataFrame(), pd.DataFrame()
+    m = trends['metrics'].index(metric)
+    delta = trends['deltas'][:, -1, m]
+    frame = pd.DataFrame({
+        'REDIZO': trends['keys'].get_level_values(0), 'KKOV_CODE': trends['keys'].get_level_values(1),
+        'before': trends['values'][:, -2, m], 'after': trends['values'][:, -1, m], 'delta': delta,
+    }).dropna(subset=['delta'])
+    return frame.nlargest(n, 'delta'), frame.nsmallest(n, 'delta')
+
+def label_groups(frame):
+    """Adds school and field labels (same format as SchoolName / FieldLabel of the long format)"""
+    if frame.empty: return frame
+    school_map, kkov_map = load_school_map(), load_kkov_map()
+    schools = {str(k): v for k, v in school_map.items()}
+    return frame.assign(
+        school=[schools.get(r, f"Neznámá škola ({r})") for r in frame['REDIZO']],
+        field=[f"{kkov_map.get(k, k)} ({k})" for k in frame['KKOV_CODE']],
+    )
@@ -1,4 +1,5 @@
 import streamlit as st
+import pandas as pd
 
 METRIC_HELP = {
     "Celkový zájem (přihlášky)": {
@@ -117,6 +118,40 @@ METRIC_HELP = {
     }
 }
 
+# Metrics offered in the comparison chart (label -> calculate_kpis key)
+COMPARABLE_METRICS = {
+    # Block 1: Hlavní výsledky
+    "Celkový zájem (přihlášky)": "total_apps",
+    "Index převisu": "comp_idx",
+    "Index reálné poptávky": "pure_demand_idx",
+    "Celková úspěšnost (%)": "success_rate",
+    
+    # Block 2: Bodová úroveň
+    "Bodový průměr přijatých": "avg_admitted",
+    "Body posledního přijatého": "min_score",
+    "Průměr horních 10 %": "elite_avg",
+    "Průměr spodních 25 %": "bottom_25_avg",
+    "Bodový rozdíl (Gap)": "talent_gap",
+    
+    # Block 3: Strategické ukazatele
+    "Poptávka skalních zájemců (%)": "interest_p1_pct",
+    "Podíl skalních žáků (%)": "intake_p1_pct",
+    "Podíl náhradních voleb (P3+) (%)": "intake_p3p_pct",
+    "Intenzita odlivu (%)": "release_rate",
+    
+    # Block 5: Kapacitní analýza
+    "Plánovaná kapacita": "planned_capacity",
+    "Míra naplněnosti (%)": "fullness_rate",
+    "Volná místa": "vacant_seats",
+    "Vzdali se přijetí": "gave_up_count",
+    "Úspěšnost 1. priority (%)": "p1_loyalty"
+}
+
+# Direction of the comparable metrics for colouring percentiles (the rest: higher is better)
+LOWER_IS_BETTER = {'intake_p3p_pct', 'release_rate', 'vacant_seats', 'gave_up_count'}
+# Neither direction is "better" (spread, size, selectivity vs. chance): shown without colour
+NEUTRAL_METRICS = {'talent_gap', 'planned_capacity', 'success_rate'}
+
 def inject_custom_css():
     """Custom CSS for a professional, 'Excel-inspired' compact look"""
     st.markdown("""
@@ -161,6 +196,19 @@ def inject_custom_css():
             font-weight: bold;
             color: #31333f;
         }
+        
+        /* National rank badges (detail view) */
+        .rank-badge {
+            display: inline-block;
+            margin: 2px 4px 2px 0;
+            padding: 2px 8px;
+            border-radius: 10px;
+            font-size: 0.8rem;
+            background-color: #e9ecef;
+            color: #31333f;
+        }
+        .rank-badge.rank-high { background-color: #d4edda; color: #155724; }
+        .rank-badge.rank-low { background-color: #f8d7da; color: #721c24; }
         </style>
         """, unsafe_allow_html=True)
 
@@ -247,3 +295,19 @@ def render_kpi_cards(kpi_data):
     c4.metric("Vzdali se přijetí", kpi_data['gave_up_count'], help=get_help("Vzdali se přijetí"))
     c5.metric("Úspěšnost 1. priority (%)", f"{kpi_data['p1_loyalty']:.1f} %", help=get_help("Úspěšnost 1. priority (%)"))
 
+
+def render_rank_badges(ranks):
+    """
+    Renders national percentile badges (one line per field) from src/ranking rows; green/red marks
+    the better/worse quarter by the metric's direction (LOWER_IS_BETTER, NEUTRAL_METRICS uncoloured)
+    """
+    for (school, field), row in ranks.iterrows():
+        badges = []
+        for label, key in COMPARABLE_METRICS.items():
+            pct = row.get(key)
+            if pct is None or pd.isna(pct): continue
+            good = 100 - pct if key in LOWER_IS_BETTER else pct
+            css = "" if key in NEUTRAL_METRICS else "rank-high" if good >= 75 else "rank-low" if good <= 25 else ""
+            badges.append(f'<span class="rank-badge {css}" title="{label}">{label}: {pct:.0f}. percentil</span>')
+        st.markdown(f"**{field}** – pořadí mezi {int(row['peers'])} obory stejného kódu KKOV")
+        st.markdown(" ".join(badges), unsafe_allow_html=True)
@@ -1,4 +1,6 @@
 import re
+import numpy as np
+import pandas as pd
 
 def clean_pdf_text(text):
     """Simple ASCII transliteration for PDF fonts that don't support Unicode"""
@@ -18,6 +20,10 @@ def get_grade_level(kkov):
     if k.endswith('/61'): return "7. (6leté)"
     return "9. (4leté/obory)"
 
+def rounds_key(rounds):
+    """Key of a round selection, e.g. (1, 2) -> '1+2'"""
+    return '+'.join(str(r) for r in sorted(rounds))
+
 def clean_col_name(col):
     """Strip non-ascii characters and normalize case"""
     s = "".join([c if ord(c) < 128 else "" for c in str(col)])
@@ -36,3 +42,49 @@ reason_map = {
 
 def get_reason_label(reason):
     return reason_map.get(reason, reason)
+
+# Reason classification: every raw ssN_duvod_neprijeti value maps to one small integer code
+REASON_ADMITTED = 0
+REASON_HIGHER_PRIORITY = 1
+REASON_CAPACITY = 2
+REASON_FAILED = 3
+REASON_GAVE_UP = 4
+REASON_UNKNOWN = 5
+
+_REASON_CODE_BY_LABEL = {
+    "Přijat na vyšší prioritu": REASON_HIGHER_PRIORITY,
+    "Kapacita": REASON_CAPACITY,
+    "Nesplnil podmínky": REASON_FAILED,
+    "Vzdal se (u nás)": REASON_GAVE_UP,
+    "Neuvedeno": REASON_UNKNOWN,
+}
+
+# Fallback for raw values missing in reason_map (order = precedence)
+_REASON_PATTERNS = [
+    (re.compile('vzdal', re.IGNORECASE), REASON_GAVE_UP),
+    (re.compile('vyssi_priorit|vyssi prioritu', re.IGNORECASE), REASON_HIGHER_PRIORITY),
+    (re.compile('kapacit', re.IGNORECASE), REASON_CAPACITY),
+    (re.compile('nespln|neprosp|nesplnil|nedosah|kriteri', re.IGNORECASE), REASON_FAILED),
+]
+
+def classify_reason(reason):
+    """Maps a raw reason string to a REASON_* code (via reason_map, regex fallback for unknown values)"""
+    label = reason_map.get(reason)
+    if label in _REASON_CODE_BY_LABEL:
+        return _REASON_CODE_BY_LABEL[label]
+    for pattern, code in _REASON_PATTERNS:
+        if pattern.search(str(reason)):
+            return code
+    return REASON_UNKNOWN
+
+def classify_reasons(reasons, admitted=None):
+    """
+    Vectorized classify_reason for a Series: each unique value is classified once.
+    If 'admitted' (bool array) is given, unlabeled admitted applications become REASON_ADMITTED.
+    """
+    cat = reasons if isinstance(reasons.dtype, pd.CategoricalDtype) else reasons.astype('category')
+    per_category = np.array([classify_reason(c) for c in cat.cat.categories] + [REASON_UNKNOWN], dtype=np.int8)
+    codes = per_category[cat.cat.codes.to_numpy()]  # missing (-1) -> REASON_UNKNOWN
+    if admitted is not None:
+        codes[(codes == REASON_UNKNOWN) & np.asarray(admitted)] = REASON_ADMITTED
+    return codes